@@ -1,10 +1,12 @@
 import os
 import uuid
+import asyncio
 import logging
 
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, HttpUrl, Field
 
+from .openai_client import log_prompt_cache_eligibility
 from .queue import JobManager, JobStatus
 from .worker import process_deploy_request
 
@@ -14,6 +16,7 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
 )
 logger = logging.getLogger("api")
+log_prompt_cache_eligibility()
 
 app = FastAPI(title="Repo Autodeployer", version="0.1.0")
 
@@ -29,37 +32,40 @@ class DeployRequest(BaseModel):
 
 @app.post("/request")
 async def request_deploy(payload: DeployRequest):
-    job_id = str(uuid.uuid4())
+    job_id = uuid.uuid4().hex
+    repo_url = str(payload.repo_url)
 
     # Prepare a unique working directory for this job
-    workdir = os.path.join("/data", "autodeploy", job_id)
-    os.makedirs(workdir, exist_ok=True)
+    workdir = f"/data/autodeploy/{job_id}"
+    # Filesystem and job-manager calls may block: keep them off the event loop
+    await asyncio.to_thread(os.makedirs, workdir, exist_ok=True)
 
-    logger.info("Enqueueing job %s for repo %s", job_id, payload.repo_url)
-    job_manager.create_job(job_id, workdir)
+    logger.info("Enqueueing job %s for repo %s", job_id, repo_url)
+    await asyncio.to_thread(job_manager.create_job, job_id, workdir)
 
     def task():
         process_deploy_request(
             job_manager=job_manager,
             job_id=job_id,
             description=payload.description,
-            repo_url=str(payload.repo_url),
+            repo_url=repo_url,
             workdir=workdir,
         )
 
-    job_manager.submit(job_id, task)
+    if not await asyncio.to_thread(job_manager.submit, job_id, task):
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later")
 
     return {"job_id": job_id, "status": JobStatus.queued}
 
 
 @app.get("/list")
 async def list_jobs():
-    return job_manager.list_jobs()
+    return await asyncio.to_thread(job_manager.list_jobs)
 
 
 @app.get("/job/{job_id}")
 async def get_job(job_id: str):
-    job = job_manager.get_job(job_id)
+    job = await asyncio.to_thread(job_manager.get_job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return job
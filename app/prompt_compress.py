@@ -0,0 +1,76 @@
+import os
+import re
+from typing import Any, Dict, List
+
+# Filename priority used to keep the most informative files when trimming LLM context.
+# Higher scores win; ties are broken by path depth (shallower first).
+_FILE_SCORES = [
+    (re.compile(r"^dockerfile$|\.dockerfile$", re.IGNORECASE), 10),
+    (re.compile(r"^(docker-)?compose\.ya?ml$", re.IGNORECASE), 9),
+    (re.compile(r"^makefile$", re.IGNORECASE), 8),
+    (re.compile(r"^readme(\.\w+)?$", re.IGNORECASE), 7),
+    (re.compile(r"\.toml$|^package\.json$|^requirements.*\.txt$|^pipfile$|^procfile$", re.IGNORECASE), 6),
+    (re.compile(r"^(app|main|server|run|manage|wsgi|asgi|index)\.(py|js|ts)$", re.IGNORECASE), 5),
+    (re.compile(r"\.lock$|-lock\.(json|yaml)$", re.IGNORECASE), 1),
+]
+_DEFAULT_SCORE = 3
+
+# Lockfiles and JSON are data, not code: no comment stripping, only a character cut
+_BLOB_RE = re.compile(r"\.lock$|\.json$|-lock\.yaml$", re.IGNORECASE)
+_LINE_COMMENT = {
+    ".py": "#", ".rb": "#", ".sh": "#",
+    ".js": "//", ".ts": "//", ".go": "//", ".java": "//", ".kt": "//", ".rs": "//",
+}
+
+
+def _score(path: str) -> int:
+    name = os.path.basename(path)
+    for pat, score in _FILE_SCORES:
+        if pat.search(name):
+            return score
+    return _DEFAULT_SCORE
+
+
+def _strip_code(path: str, content: str) -> str:
+    marker = _LINE_COMMENT.get(os.path.splitext(path)[1].lower())
+    out: List[str] = []
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        # Keep shebangs and encoding lines; drop full-line comments
+        if marker and stripped.startswith(marker) and not stripped.startswith("#!"):
+            continue
+        out.append(line.rstrip())
+    return "\n".join(out)
+
+
+def _compress_file(path: str, content: str, max_bytes: int) -> str:
+    # Never word-wrap data: a long token (minified JSON) would take everything after it along
+    if not _BLOB_RE.search(path):
+        content = _strip_code(path, content)
+    if len(content) > max_bytes:
+        content = content[:max_bytes] + "\n...[truncated]"
+    return content
+
+
+def compress_context(ctx: Dict[str, Any], max_files: int = 20, max_bytes_per_file: int = 2048) -> Dict[str, Any]:
+    """
+    Return a copy of an LLM context whose `files` list keeps only the top-ranked
+    files, each stripped of blank/comment lines and truncated to max_bytes_per_file.
+    Contexts without a `files` list are returned unchanged.
+    """
+    files = ctx.get("files")
+    if not isinstance(files, list):
+        return ctx
+    ranked = sorted(
+        (f for f in files if isinstance(f, dict) and "path" in f),
+        key=lambda f: (-_score(f["path"]), f["path"].count("/")),
+    )[:max_files]
+    # Entries carrying only a summary (e.g. lockfiles) are already compact
+    compressed = [
+        f if "summary" in f and "content" not in f
+        else {**f, "content": _compress_file(f["path"], f.get("content") or "", max_bytes_per_file)}
+        for f in ranked
+    ]
+    return {**ctx, "files": compressed}
@@ -1,7 +1,10 @@
+import os
+import queue
+import shutil
 import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Dict, Any, Optional
+from collections import deque
+from typing import Callable, Dict, Any, Optional, Union
 
 
 class JobStatus:
@@ -11,83 +14,259 @@ class JobStatus:
     failed = "failed"
 
 
+# Number of most recent log lines kept in memory per job; the full history goes to disk
+JOB_LOG_MEM = int(os.environ.get("JOB_LOG_MEM", "2000"))
+JOB_LOG_FILENAME = "job.log"
+# Maximum number of jobs waiting for a worker; submissions beyond this are rejected
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "32"))
+# Upper bound on waiting for the drain thread to catch up with a handler's records
+JOB_LOG_FLUSH_TIMEOUT_S = float(os.environ.get("JOB_LOG_FLUSH_TIMEOUT_S", "10"))
+
+
+class _LogDrainer:
+    """
+    Single background thread that formats and stores job log records, so worker
+    threads only pay for a lock-free SimpleQueue.put when they log.
+    A (handler, None) item closes that handler's log file, in order with its records;
+    a (handler, Event) item flushes the file and sets the event once every record
+    queued before it is stored.
+    """
+
+    def __init__(self):
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def put(self, handler: "InMemoryJobLogger", record: Union[logging.LogRecord, threading.Event, None]) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="job-log-drainer", daemon=True)
+                    self._thread.start()
+        self._q.put_nowait((handler, record))
+
+    def _loop(self) -> None:
+        while True:
+            handler, record = self._q.get()
+            try:
+                if record is None:
+                    handler._close_file()
+                elif isinstance(record, threading.Event):
+                    try:
+                        handler._flush_file()
+                    finally:
+                        record.set()
+                else:
+                    handler._store(record)
+            except Exception:
+                pass
+
+    def in_drain_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+
+_log_drainer = _LogDrainer()
+
+
 class InMemoryJobLogger(logging.Handler):
-    def __init__(self, job_logs: list):
+    def __init__(self, job_logs: deque, lock: Optional[threading.Lock] = None, log_path: Optional[str] = None):
         super().__init__()
         self.job_logs = job_logs
+        self.job_lock = lock
+        self._file = None
+        if log_path:
+            try:
+                self._file = open(log_path, "a", buffering=8192)
+            except OSError:
+                self._file = None
 
     def emit(self, record: logging.LogRecord) -> None:
+        # Formatting and storage happen on the drain thread
+        _log_drainer.put(self, record)
+
+    def _store(self, record: logging.LogRecord) -> None:
         msg = self.format(record)
-        self.job_logs.append(msg)
+        if self.job_lock is not None:
+            with self.job_lock:
+                self.job_logs.append(msg)
+        else:
+            self.job_logs.append(msg)
+        if self._file is not None:
+            try:
+                self._file.write(msg + "\n")
+            except Exception:
+                self.handleError(record)
+
+    def _flush_file(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def flush(self) -> None:
+        # Block until the drain thread has written every record emitted so far
+        # (also called by logging.shutdown at exit, so queued records are not lost)
+        if _log_drainer.in_drain_thread():
+            return
+        done = threading.Event()
+        _log_drainer.put(self, done)
+        done.wait(JOB_LOG_FLUSH_TIMEOUT_S)
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+    def close(self) -> None:
+        # Queue the close behind any pending records for this handler
+        _log_drainer.put(self, None)
+        super().close()
 
 
 class JobManager:
-    def __init__(self, max_workers: int = 2):
-        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+    def __init__(self, max_workers: int = 2, max_queued: int = JOB_QUEUE_MAX):
+        # Bounded backlog gives backpressure instead of queueing jobs indefinitely
+        self._queue: "queue.Queue[Callable[[], None]]" = queue.Queue(maxsize=max_queued)
+        # Job insert/lookup relies on dict atomicity; mutations of a job take only its own lock
         self._jobs: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
+        self._job_locks: Dict[str, threading.Lock] = {}
+        # Per-job loggers with their handler attached, cached until the job finishes
+        self._job_loggers: Dict[str, logging.Logger] = {}
         self._logger = logging.getLogger("JobManager")
+        # Workers start last: they may touch any of the state above
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for t in self._workers:
+            t.start()
 
     def create_job(self, job_id: str, workdir: str):
-        with self._lock:
-            self._jobs[job_id] = {
-                "id": job_id,
-                "status": JobStatus.queued,
-                "workdir": workdir,
-                "logs": [],
-                "result": None,
-                "error": None,
-            }
+        # Register the lock first so the job is never visible without one
+        self._job_locks[job_id] = threading.Lock()
+        self._jobs[job_id] = {
+            "id": job_id,
+            "status": JobStatus.queued,
+            "workdir": workdir,
+            "logs": deque(maxlen=JOB_LOG_MEM),
+            "result": None,
+            "error": None,
+        }
 
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            return self._jobs.get(job_id)
+        job = self._jobs.get(job_id)
+        lock = self._job_locks.get(job_id)
+        # A rejected job may be discarded between the two lookups
+        if job is None or lock is None:
+            return None
+        # Snapshot the log ring buffer; full history lives in <workdir>/job.log
+        with lock:
+            return {**job, "logs": list(job["logs"])}
 
     def list_jobs(self):
-        # Return job metadata without logs to keep the listing lightweight
-        with self._lock:
-            jobs = []
-            for job in self._jobs.values():
-                j = {k: v for k, v in job.items() if k != "logs"}
-                j["log_count"] = len(job.get("logs", []))
-                jobs.append(j)
-            return jobs
+        # Return job metadata without logs to keep the listing lightweight.
+        # Iterate over a snapshot so concurrent create_job calls don't break the loop.
+        jobs = []
+        for job in list(self._jobs.values()):
+            j = {k: v for k, v in job.items() if k != "logs"}
+            j["log_count"] = len(job.get("logs", []))
+            jobs.append(j)
+        return jobs
 
     def _set_status(self, job_id: str, status: str):
-        with self._lock:
-            if job_id in self._jobs:
-                self._jobs[job_id]["status"] = status
+        lock = self._job_locks.get(job_id)
+        if lock is None:
+            return
+        with lock:
+            self._jobs[job_id]["status"] = status
 
     def _append_log(self, job_id: str, message: str):
-        with self._lock:
-            if job_id in self._jobs:
-                self._jobs[job_id]["logs"].append(message)
+        lock = self._job_locks.get(job_id)
+        if lock is None:
+            return
+        with lock:
+            self._jobs[job_id]["logs"].append(message)
 
     def get_job_logger(self, job_id: str) -> logging.Logger:
+        cached = self._job_loggers.get(job_id)
+        if cached is not None:
+            return cached
         logger = logging.getLogger(f"job.{job_id}")
         logger.setLevel(logging.INFO)
         # Avoid duplicate handlers if called multiple times
         if not any(isinstance(h, InMemoryJobLogger) for h in logger.handlers):
-            job = self.get_job(job_id)
+            job = self._jobs.get(job_id)
             if job is not None:
-                handler = InMemoryJobLogger(job["logs"]) 
+                handler = InMemoryJobLogger(
+                    job["logs"],
+                    lock=self._job_locks.get(job_id),
+                    log_path=os.path.join(job["workdir"], JOB_LOG_FILENAME),
+                )
                 formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s - %(message)s')
                 handler.setFormatter(formatter)
                 logger.addHandler(handler)
+                self._job_loggers[job_id] = logger
         return logger
 
-    def submit(self, job_id: str, fn: Callable[[], None]):
-        self._set_status(job_id, JobStatus.running)
+    def finalize(self, job_id: str):
+        """
+        Release a finished job's logger: detach its handler, wait until its pending
+        records are stored and written to the log file, close it and drop it from our
+        cache. The logging registry is left alone: it is shared with every other
+        thread calling logging.getLogger.
+        """
+        logger = self._job_loggers.pop(job_id, None) or logging.getLogger(f"job.{job_id}")
+        for h in list(logger.handlers):
+            if isinstance(h, InMemoryJobLogger):
+                logger.removeHandler(h)
+                h.flush()
+                h.close()
+
+    def _worker_loop(self):
+        while True:
+            fn = self._queue.get()
+            try:
+                fn()
+            except Exception:
+                self._logger.exception("Unhandled error in job worker")
+            finally:
+                self._queue.task_done()
+
+    def _discard_job(self, job_id: str):
+        # A rejected job never ran: drop its workdir too (including the job.log just opened)
+        self.finalize(job_id)
+        job = self._jobs.pop(job_id, None)
+        self._job_locks.pop(job_id, None)
+        if job is not None:
+            shutil.rmtree(job["workdir"], ignore_errors=True)
+
+    def submit(self, job_id: str, fn: Callable[[], None]) -> bool:
+        """
+        Enqueue a job for execution. Returns False (and forgets the job, removing its
+        workdir) when the backlog is full so the caller can reject the request.
+        """
         job_logger = self.get_job_logger(job_id)
-        job_logger.info("Job started")
 
         def _wrapper():
+            self._set_status(job_id, JobStatus.running)
+            job_logger.info("Job started")
+            status = JobStatus.failed
             try:
                 fn()
-                self._set_status(job_id, JobStatus.completed)
+                status = JobStatus.completed
                 job_logger.info("Job completed successfully")
             except Exception as e:
-                self._set_status(job_id, JobStatus.failed)
                 job_logger.exception("Job failed: %s", e)
+            finally:
+                # Every log line (traceback included) is stored before the final status shows
+                self.finalize(job_id)
+                self._set_status(job_id, status)
 
-        self._executor.submit(_wrapper)
+        try:
+            self._queue.put_nowait(_wrapper)
+        except queue.Full:
+            self._logger.warning("Job queue full (%d pending); rejecting job %s", self._queue.maxsize, job_id)
+            self._discard_job(job_id)
+            return False
+        job_logger.info("Job queued")
+        return True
@@ -1,7 +1,51 @@
 # Centralized large text templates with .format-style placeholders
-# Use double braces {{ }} to emit literal braces in HCL/YAML where needed
+# Use double braces {{ }} to emit literal braces in HCL/YAML where needed.
+# Brace-heavy HCL templates use HclTemplate ${placeholder} substitution instead.
+import re
+import sys
+import string
+import functools
+from typing import Any, Callable, Dict
 
-COMPOSE_TEMPLATE = """
+from .constants import AMI_DATA_SNIPPET
+
+
+def compile_template(template: str) -> Callable[..., str]:
+    """
+    Parse a .format-style template once and return a renderer that only splices
+    keyword values between the pre-split literal chunks. Format specs and
+    conversions are not supported.
+    """
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if spec or conversion:
+            raise ValueError(f"Unsupported format spec in template field {field!r}")
+        parts.append((literal, field))
+
+    def render(**kwargs) -> str:
+        return "".join(lit + (str(kwargs[f]) if f is not None else "") for lit, f in parts)
+
+    return render
+
+
+class HclTemplate(string.Template):
+    """
+    string.Template where only ${identifier} is a placeholder. Braces need no
+    escaping, and HCL interpolations such as ${var.region} pass through untouched
+    because they are not plain identifiers. Missing placeholders raise KeyError.
+    """
+
+    pattern = r"""
+    \$(?:
+        (?P<escaped>(?!))|
+        (?P<named>(?!))|
+        {(?P<braced>[_a-z][_a-z0-9]*)}|
+        (?P<invalid>(?!))
+    )
+    """
+
+
+COMPOSE_TEMPLATE = """\
 version: '3.9'
 services:
   app:
@@ -15,9 +59,9 @@ services:
     environment:
       - PORT={internal_port}
     # Optionally override command via environment or current repo conventions
-""".lstrip()
+"""
 
-MAKEFILE_TEMPLATE = """
+MAKEFILE_TEMPLATE = """\
 .PHONY: up down logs
 
 up:
@@ -33,9 +77,9 @@ logs:
 
 down:
 	docker compose down -v
-""".lstrip()
+"""
 
-TERRAFORM_HINTS_TEMPLATE = """
+TERRAFORM_HINTS_TEMPLATE = """\
 - Region: ca-central-1
 - Instance type: {instance_type}
 - OS: Ubuntu 24.04 (Noble) official Canonical AMI
@@ -50,9 +94,9 @@ TERRAFORM_HINTS_TEMPLATE = """
   - Ensure the connection uses user 'ubuntu' and the generated private key
   - Output public_ip
 - Provider must rely on AWS_* env vars at runtime (do not hardcode keys).
-""".lstrip()
+"""
 
-REMOTE_EXEC_SNIPPET = """
+REMOTE_EXEC_SNIPPET = """\
 provisioner "remote-exec" {
   inline = [
     "sudo -n sed -i 's|http://[^ ]*ec2.archive.ubuntu.com/ubuntu|http://archive.ubuntu.com/ubuntu|g' /etc/apt/sources.list || true",
@@ -67,112 +111,115 @@ provisioner "remote-exec" {
     "cd /opt/app && sudo -n -E make up",
   ]
 }
-""".lstrip()
+"""
+
 
-TERRAFORM_FALLBACK_TEMPLATE = """
-terraform {{
-  required_providers {{
-    aws = {{
+# Only needed when the LLM Terraform is rejected: built on first access via __getattr__
+def _build_terraform_fallback_template() -> str:
+    return """\
+terraform {
+  required_providers {
+    aws = {
       source  = "hashicorp/aws"
       version = "~> 5.0"
-    }}
-    tls = {{
+    }
+    tls = {
       source  = "hashicorp/tls"
       version = "~> 4.0"
-    }}
-    local = {{
+    }
+    local = {
       source  = "hashicorp/local"
       version = "~> 2.0"
-    }}
-  }}
-}}
+    }
+  }
+}
 
-provider "aws" {{
+provider "aws" {
   region = var.region
-}}
+}
 
-variable "region" {{ default = "ca-central-1" }}
-variable "az_suffix" {{ default = "a" }}
+variable "region" { default = "ca-central-1" }
+variable "az_suffix" { default = "a" }
 
-resource "tls_private_key" "ssh" {{
+resource "tls_private_key" "ssh" {
   algorithm = "RSA"
   rsa_bits  = 4096
-}}
+}
 
-resource "local_file" "private_key_pem" {{
+resource "local_file" "private_key_pem" {
   content              = tls_private_key.ssh.private_key_pem
   filename             = "id_rsa"
   file_permission      = "0600"
   directory_permission = "0700"
-}}
+}
 
-{ami_data_snippet}
+${ami_data_snippet}
 
 # Networking: VPC with public subnet and Internet access
-resource "aws_vpc" "main" {{
+resource "aws_vpc" "main" {
   cidr_block           = "10.0.0.0/16"
   enable_dns_support   = true
   enable_dns_hostnames = true
-  tags = {{ Name = "autodeployer-vpc" }}
-}}
+  tags = { Name = "autodeployer-vpc" }
+}
 
-resource "aws_internet_gateway" "igw" {{
+resource "aws_internet_gateway" "igw" {
   vpc_id = aws_vpc.main.id
-  tags = {{ Name = "autodeployer-igw" }}
-}}
+  tags = { Name = "autodeployer-igw" }
+}
 
-resource "aws_subnet" "public" {{
+resource "aws_subnet" "public" {
   vpc_id                  = aws_vpc.main.id
   cidr_block              = "10.0.1.0/24"
-  availability_zone       = "${{var.region}}${{var.az_suffix}}"
+  availability_zone       = "${var.region}${var.az_suffix}"
   map_public_ip_on_launch = true
-  tags = {{ Name = "autodeployer-public" }}
-}}
+  tags = { Name = "autodeployer-public" }
+}
 
-resource "aws_route_table" "public" {{
+resource "aws_route_table" "public" {
   vpc_id = aws_vpc.main.id
   # Note: the local route to 10.0.0.0/16 is implicit in AWS and cannot be explicitly created via Terraform.
-  route {{
+  route {
     cidr_block = "0.0.0.0/0"
     gateway_id = aws_internet_gateway.igw.id
-  }}
-  tags = {{ Name = "autodeployer-rt" }}
-}}
+  }
+  tags = { Name = "autodeployer-rt" }
+}
 
-resource "aws_route_table_association" "public" {{
+resource "aws_route_table_association" "public" {
   subnet_id      = aws_subnet.public.id
   route_table_id = aws_route_table.public.id
-}}
+}
 
-resource "aws_security_group" "app" {{
+resource "aws_security_group" "app" {
   name_prefix = "autodeployer-sg-"
   description = "Allow SSH and 8080"
   vpc_id      = aws_vpc.main.id
 
-  ingress {{
+  ingress {
     from_port   = 22
     to_port     = 22
     protocol    = "tcp"
     cidr_blocks = ["0.0.0.0/0"]
-  }}
-  ingress {{
+  }
+  ingress {
     from_port   = 8080
     to_port     = 8080
     protocol    = "tcp"
     cidr_blocks = ["0.0.0.0/0"]
-  }}
-  egress {{
+  }
+  egress {
     from_port        = 0
     to_port          = 0
     protocol         = "-1"
     cidr_blocks      = ["0.0.0.0/0"]
     ipv6_cidr_blocks = ["::/0"]
-  }}
-}}
+  }
+}
 
-resource "aws_instance" "app" {{
+resource "aws_instance" "app" {
   ami                    = data.aws_ami.ubuntu.id
-  instance_type          = "{instance_type}"
+  instance_type          = "${instance_type}"
   subnet_id               = aws_subnet.public.id
   vpc_security_group_ids  = [aws_security_group.app.id]
   associate_public_ip_address = true
@@ -185,40 +232,41 @@ resource "aws_instance" "app" {{
                   sudo: "ALL=(ALL) NOPASSWD:ALL"
                   shell: /bin/bash
                   ssh_authorized_keys:
-                    - ${{tls_private_key.ssh.public_key_openssh}}
+                    - ${tls_private_key.ssh.public_key_openssh}
               EOT
-  tags = {{ Name = "autodeployer-{name_suffix}" }}
-}}
+  tags = { Name = "autodeployer-${name_suffix}" }
+}
 
-resource "null_resource" "provision" {{
+resource "null_resource" "provision" {
   depends_on = [aws_instance.app]
 
-  connection {{
+  connection {
     type        = "ssh"
     host        = aws_instance.app.public_ip
     user        = "ubuntu"
     private_key = tls_private_key.ssh.private_key_pem
-  }}
+  }
 
-  provisioner "file" {{
+  provisioner "file" {
     source      = "app.tar.gz"
     destination = "/home/ubuntu/app.tar.gz"
-  }}
+  }
 
-  {remote_exec_snippet}
-}}
+  ${remote_exec_snippet}
+}
 
-output "public_ip" {{
+output "public_ip" {
   value = aws_instance.app.public_ip
-}}
-""".lstrip()
+}
+"""
+
 
 LLM_TERRAFORM_SYSTEM_PROMPT_TEMPLATE = (
     "You are a Terraform expert. Generate minimal, working Terraform (main.tf) with restricted IAM assumptions: "
     "- Provision t2.small in ca-central-1 on Ubuntu 24.04 (Canonical AMI). Ensure the chosen Availability Zone supports this instance type (e.g., prefer ca-central-1a/b); if creating a subnet, set availability_zone accordingly. "
     "- Open ports 22 and 8080 (ingress) and allow all outbound egress (ipv4 0.0.0.0/0 and ipv6 ::/0). "
     "- Create an SSH key via tls_private_key ONLY; do NOT use aws_key_pair. "
-    "- In cloud-init user_data, add the public key to the ubuntu user's authorized keys using exact Terraform interpolation ${{tls_private_key.ssh.public_key_openssh}} (single pair of braces), and ensure passwordless sudo: set groups: [sudo] and sudo: \"ALL=(ALL) NOPASSWD:ALL\" for the ubuntu user. "
+    "- In cloud-init user_data, add the public key to the ubuntu user's authorized keys using exact Terraform interpolation ${tls_private_key.ssh.public_key_openssh} (single pair of braces), and ensure passwordless sudo: set groups: [sudo] and sudo: \"ALL=(ALL) NOPASSWD:ALL\" for the ubuntu user. "
     "- For networking, ensure outbound internet: attach the instance to a public subnet with an Internet Gateway and route 0.0.0.0/0 to the IGW. The local route for the VPC CIDR (e.g., 10.0.0.0/16) is implicit in AWS route tables; do not try to create it. If a default VPC/subnet isn’t available, create a minimal VPC + public subnet + IGW + route table + association, and enable DNS support/hostnames on the VPC. "
     "- For Security Groups, DO NOT set a fixed 'name'. Instead set name_prefix = \"autodeployer-sg-\" to avoid duplicate name errors. "
     "- Upload a provided app.tar.gz to /home/ubuntu/app.tar.gz using file provisioner. "
@@ -236,7 +284,7 @@ LLM_TERRAFORM_SYSTEM_PROMPT_TEMPLATE = (
     "- When writing inline remote-exec command lists in HCL, ensure any inner double quotes are escaped as \\\" (e.g., echo \\\"...\\\")."
 )
 
-LLM_DOCKERFILE_SYSTEM_PROMPT = f"""
+LLM_DOCKERFILE_SYSTEM_PROMPT = """
     "You are a senior DevOps engineer. Produce a working Dockerfile tailored to the provided project files. "
     "Requirements: "
     "- Choose an appropriate official base image (e.g., python:*\-slim for Python, node:* for Node). "
@@ -249,19 +297,24 @@ LLM_DOCKERFILE_SYSTEM_PROMPT = f"""
     "- Output format rules (mandatory): Respond with ONLY the Dockerfile content, no Markdown code fences, no surrounding quotes, and no explanations."
 """
 
-LLM_COMPOSE_SYSTEM_PROMPT = f"""
+_LLM_COMPOSE_PROMPT_HEAD = """
     "You are a senior DevOps engineer. Generate a valid docker-compose.yml for running the given repository. "
     "Follow these rules: "
     "- Keep in mind repo files are in ./repo. When choosing paths to build the image in compose, consider the compose file you're creating is 1 level above ./repo (refer to the provided tree as this compose file will be found under '../repo', at root level)."
-    "- Here is an example of compose configuration for a simple app: {COMPOSE_TEMPLATE}"
+    "- Here is an example of compose configuration for a simple app: """
+
+_LLM_COMPOSE_PROMPT_TAIL = """"
     "- If you didn't decided to use Docker-in-Docker, then don't use or refer /var/run/docker.sock"
     "- Generate a compose file that builds the app from available in repo root, maps host 8080 to the app's internal port, and sets PORT env accordingly. Prefer overriding the default run command to ensure the service binds to 0.0.0.0 even if the source code tries to bind 127.0.0.1. For Python/Flask, prefer `gunicorn module:app -b 0.0.0.0:<port>`. "
     "- Ensure the wrapper compose waits for dockerd to be ready before running inner commands. "
-    "- Do NOT use ${{PORT}} or other ${{VAR}} expansions in YAML values (Compose substitutes from host). Use $$PORT to defer to the container shell, or hardcode the numeric port provided in context. "
+    "- Do NOT use ${PORT} or other ${VAR} expansions in YAML values (Compose substitutes from host). Use $$PORT to defer to the container shell, or hardcode the numeric port provided in context. "
     "- To help you determine the paths to mount or working dir, consider the file tree. You are creating the compose configuration that will be run at the tree top level, so choose working_dir and paths to mount repo files in concordance."
     "- The output MUST be only the YAML content of docker-compose.yml, no code fences, no comments at top, no explanations. "
 """
 
+# Single join sized to the final prompt; COMPOSE_TEMPLATE is spliced in verbatim
+LLM_COMPOSE_SYSTEM_PROMPT = "".join([_LLM_COMPOSE_PROMPT_HEAD, COMPOSE_TEMPLATE, _LLM_COMPOSE_PROMPT_TAIL])
+
 LLM_SETUP_SCRIPT_SYSTEM_PROMPT = (
     "You are a senior DevOps engineer. Generate an idempotent bash setup script (setup.sh) to prepare running the repository's service(s). "
     "Use signals from the file tree and README to infer necessary steps: creating .env files with sane defaults, running migrations, building assets, generating keys, etc. "
@@ -275,3 +328,64 @@ LLM_SETUP_SCRIPT_SYSTEM_PROMPT = (
     "- Print progress with echo. "
     "- Output MUST be only the script content, no code fences, no explanations. "
 )
+
+# Static files written verbatim into every deployment: frozen to bytes once so writes skip encoding
+MAKEFILE_TEMPLATE_BYTES = MAKEFILE_TEMPLATE.encode("ascii")
+SETUP_PLACEHOLDER_BYTES = b"#!/usr/bin/env bash\nset -euo pipefail\necho 'No setup required.'\n"
+
+# Interned so dict lookups keyed by these prompts (e.g. prompt cache keys) hit the identity fast path
+LLM_TERRAFORM_SYSTEM_PROMPT_TEMPLATE = sys.intern(LLM_TERRAFORM_SYSTEM_PROMPT_TEMPLATE)
+LLM_DOCKERFILE_SYSTEM_PROMPT = sys.intern(LLM_DOCKERFILE_SYSTEM_PROMPT)
+LLM_COMPOSE_SYSTEM_PROMPT = sys.intern(LLM_COMPOSE_SYSTEM_PROMPT)
+LLM_SETUP_SCRIPT_SYSTEM_PROMPT = sys.intern(LLM_SETUP_SCRIPT_SYSTEM_PROMPT)
+
+# Renderers compiled once at import; prefer these over TEMPLATE.format(...)
+TERRAFORM_HINTS_RENDER = compile_template(TERRAFORM_HINTS_TEMPLATE)
+
+# The AMI and remote-exec snippets never change per deployment: splice them in once so
+# renders only substitute instance_type and name_suffix
+def _build_terraform_fallback_partial() -> str:
+    return HclTemplate(_lazy("TERRAFORM_FALLBACK_TEMPLATE")).safe_substitute(
+        ami_data_snippet=AMI_DATA_SNIPPET,
+        remote_exec_snippet=REMOTE_EXEC_SNIPPET,
+    )
+
+
+_LAZY_TEMPLATES: Dict[str, Callable[[], Any]] = {
+    "TERRAFORM_FALLBACK_TEMPLATE": _build_terraform_fallback_template,
+    "TERRAFORM_FALLBACK_PARTIAL": _build_terraform_fallback_partial,
+    "TERRAFORM_FALLBACK_RENDER": lambda: HclTemplate(_lazy("TERRAFORM_FALLBACK_PARTIAL")).substitute,
+}
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: build rarely used templates on first access, then cache them as module globals
+    builder = _LAZY_TEMPLATES.get(name)
+    if builder is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = builder()
+    globals()[name] = value
+    return value
+
+
+def _lazy(name: str) -> Any:
+    # Module code does not go through __getattr__, so resolve lazy globals explicitly
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
+# Deployments reuse a handful of argument tuples; memoize the rendered text.
+# Call .cache_clear() on it if the underlying template is ever reloaded.
+@functools.lru_cache(maxsize=64)
+def render_terraform_fallback(instance_type: str, name_suffix: str) -> str:
+    return _lazy("TERRAFORM_FALLBACK_RENDER")(instance_type=instance_type, name_suffix=name_suffix)
+
+
+# The Terraform prompt has two placeholders and literal HCL braces: substitute just those
+# two names with a precompiled pattern instead of .format (no brace doubling needed)
+_LLM_TF_PLACEHOLDER_RE = re.compile(r"\{(ami_data_snippet|remote_exec_snippet)\}")
+
+
+@functools.lru_cache(maxsize=8)
+def render_llm_terraform_prompt(ami_data_snippet: str, remote_exec_snippet: str) -> str:
+    values = {"ami_data_snippet": ami_data_snippet, "remote_exec_snippet": remote_exec_snippet}
+    return _LLM_TF_PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], LLM_TERRAFORM_SYSTEM_PROMPT_TEMPLATE)
@@ -1,40 +1,134 @@
 import os
 import re
+import gzip
+import json
+import mmap
+import hashlib
+import asyncio
 import shutil
 import subprocess
 import tarfile
-from pathlib import Path
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import logging
-from .queue import JobManager
-from .openai_client import generate_terraform_from_llm, generate_dockerfile_from_llm, generate_compose_from_llm, generate_setup_script_from_llm
+
+try:
+    # Optional: compiles the HTTP hints to a single DFA scanned at multi-GB/s
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+from .queue import JobManager, JOB_LOG_FILENAME
+from .openai_client import (
+    LLM_BATCH_API,
+    generate_terraform_from_llm,
+    generate_compose_from_llm,
+    generate_all,
+    generate_via_batch,
+)
 from .constants import (
     DEFAULT_AWS_INSTANCE,
     DRY_TERRAFORM_DEPLOYS,
-    AMI_DATA_SNIPPET,
-    DIND_WRAPPER_DEFAULT_FAILOVER,
-    DIND_WRAPPER_LOCALHOST_FAILOVER
 )
 from .templates import (
-    REMOTE_EXEC_SNIPPET,
-    COMPOSE_TEMPLATE,
-    MAKEFILE_TEMPLATE,
-    TERRAFORM_HINTS_TEMPLATE,
-    TERRAFORM_FALLBACK_TEMPLATE,
+    MAKEFILE_TEMPLATE_BYTES,
+    SETUP_PLACEHOLDER_BYTES,
+    TERRAFORM_HINTS_RENDER,
+    render_terraform_fallback,
+)
+
+# Command output is pulled in chunks of this size and split into lines in Python
+RUN_READ_CHUNK = 64 * 1024
+# Longest partial line kept while waiting for its newline; beyond this it is logged truncated
+RUN_READ_LIMIT = 1 << 20
+
+
+async def _run_async(cmd: List[str], cwd: Optional[str], log: logging.Logger, env: Optional[dict]) -> int:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=cwd, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        limit=RUN_READ_LIMIT,
+        # Own session: signals aimed at the API process group don't hit long terraform runs
+        start_new_session=True,
+    )
+    pending = b""
+    while True:
+        chunk = await proc.stdout.read(RUN_READ_CHUNK)  # type: ignore
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b"\n")
+        for raw in lines:
+            log.info(raw.decode(errors="replace").rstrip())
+        if len(pending) > RUN_READ_LIMIT:
+            log.info("%s [output line exceeded %d bytes; truncated]", pending[:RUN_READ_LIMIT].decode(errors="replace"), RUN_READ_LIMIT)
+            pending = b""
+    if pending:
+        log.info(pending.decode(errors="replace").rstrip())
+    return await proc.wait()
+
+
+def run(cmd: List[str], cwd: Optional[str], log: logging.Logger, env: Optional[dict] = None):
+    # Each job thread drives its own short-lived event loop
+    returncode = asyncio.run(_run_async(cmd, cwd, log, env))
+    if returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(cmd)} (code {returncode})")
+
+
+# Variables Terraform and its AWS provider actually read; everything else (API keys,
+# app settings) stays out of the child environment
+TERRAFORM_ENV_PREFIXES = (
+    "AWS_", "TF_", "PATH", "HOME", "LANG", "LC_", "TMPDIR", "SSL_CERT_",
+    "HTTP_PROXY", "HTTPS_PROXY", "NO_PROXY", "http_proxy", "https_proxy", "no_proxy",
 )
 
-def run(cmd: List[str], cwd: Optional[str], log: logging.Logger):
-    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    for line in proc.stdout:  # type: ignore
-        log.info(line.rstrip())
-    proc.wait()
-    if proc.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)} (code {proc.returncode})")
 
+# Shared provider cache so `terraform init` links the AWS provider instead of downloading
+# it for every job. Set TF_PLUGIN_CACHE_DIR to an empty string to disable.
+TF_PLUGIN_CACHE_DIR = os.environ.get("TF_PLUGIN_CACHE_DIR", "/data/autodeploy/.terraform_plugins")
+# Terraform does not guarantee concurrent inits can share the cache: serialize them
+_TF_INIT_LOCK = threading.Lock()
+
+
+def terraform_env() -> dict:
+    env = {k: v for k, v in os.environ.items() if k.startswith(TERRAFORM_ENV_PREFIXES)}
+    if TF_PLUGIN_CACHE_DIR:
+        try:
+            os.makedirs(TF_PLUGIN_CACHE_DIR, exist_ok=True)
+        except OSError:
+            return env
+        env["TF_PLUGIN_CACHE_DIR"] = TF_PLUGIN_CACHE_DIR
+        # Each job starts without a lock file; let init use cached providers anyway
+        env.setdefault("TF_PLUGIN_CACHE_MAY_BREAK_DEPENDENCY_LOCK_FILE", "true")
+    return env
 
-def clone_repo(repo_url: str, dest: str, log: logging.Logger):
-    run(["git", "clone", "--depth", "1", repo_url, dest], cwd=None, log=log)
+
+# The local object store is throwaway (.git is deleted right after HEAD is read and never
+# archived): zlib-compressing it would only burn CPU.
+# Never prompt for credentials: a private or missing repo fails fast instead of hanging
+GIT_CLONE_ENV = {
+    "GIT_CONFIG_COUNT": "1",
+    "GIT_CONFIG_KEY_0": "core.compression",
+    "GIT_CONFIG_VALUE_0": "0",
+    "GIT_TERMINAL_PROMPT": "0",
+}
+
+
+def clone_repo(repo_url: str, dest: str, log: logging.Logger) -> Optional[str]:
+    # Shallow, single-branch, tagless partial clone: only the blobs of the checked-out tree are fetched
+    run(
+        ["git", "clone", "--depth", "1", "--single-branch", "--no-tags", "--filter=blob:none", repo_url, dest],
+        cwd=None,
+        log=log,
+        env={**os.environ, **GIT_CLONE_ENV},
+    )
+    # Record the checked-out commit before the metadata goes away
+    head_sha = None
+    try:
+        head_sha = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=dest, text=True).strip() or None
+    except Exception as e:
+        log.warning("Could not read cloned HEAD commit: %s", e)
     # Remove VCS metadata to avoid transferring unnecessary history and credentials
     git_dir = os.path.join(dest, ".git")
     if os.path.exists(git_dir):
@@ -43,23 +137,94 @@ def clone_repo(repo_url: str, dest: str, log: logging.Logger):
             log.info("Removed .git directory at %s", git_dir)
         except Exception as e:
             log.warning("Failed to remove .git directory: %s", e)
+    return head_sha
+
+
+# Tree listings feed LLM prompts: stop after this many items, and summarize directories
+# larger than LIST_TREE_DIR_MAX_ENTRIES (typically vendored deps) instead of listing them
+LIST_TREE_MAX_ITEMS = 500
+LIST_TREE_DIR_MAX_ENTRIES = 2000
 
 
-def list_tree(root: str, max_depth: int = 4) -> List[str]:
-    root_path = Path(root)
+def _sorted_entries(p: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(p) as it:
+            return sorted(it, key=lambda e: e.name)
+    except OSError:
+        return []
+
+
+def _tree_dir_item(rel: str, children: List[os.DirEntry]) -> str:
+    if len(children) > LIST_TREE_DIR_MAX_ENTRIES:
+        return f"{rel}/ ({len(children)} entries, not listed)"
+    return rel + "/"
+
+
+def list_tree(root: str, max_depth: int = 4, max_items: int = LIST_TREE_MAX_ITEMS) -> List[str]:
+    root = root.rstrip("/") or "/"
+    # Relative paths are sliced off entry.path instead of building Path objects
+    prefix_len = len(root) if root.endswith("/") else len(root) + 1
     items: List[str] = []
 
-    def _walk(p: Path, depth: int):
+    # Iterative pre-order walk; children are pushed reversed so they pop in sorted order
+    stack = [(e, 0) for e in reversed(_sorted_entries(root))]
+    while stack and len(items) < max_items:
+        entry, depth = stack.pop()
+        rel = entry.path[prefix_len:]
+        if not entry.is_dir(follow_symlinks=False):
+            items.append(rel)
+            continue
+        if depth >= max_depth:
+            items.append(rel + "/")
+            continue
+        children = _sorted_entries(entry.path)
+        items.append(_tree_dir_item(rel, children))
+        if len(children) <= LIST_TREE_DIR_MAX_ENTRIES:
+            stack.extend((e, depth + 1) for e in reversed(children))
+    return items
+
+
+_TREE_DIR_NOTE_RE = re.compile(r"^(.*)/ \(\d+ entries, not listed\)$")
+
+
+def _nest_tree(name: str, sub_tree: List[str], max_depth: int) -> List[str]:
+    # Re-root list_tree output of <parent>/<name> as entries of <parent>
+    out: List[str] = []
+    for item in sub_tree:
+        note = _TREE_DIR_NOTE_RE.match(item)
+        path = note.group(1) if note else item.rstrip("/")
+        depth = path.count("/") + 1
         if depth > max_depth:
-            return
-        for entry in sorted(p.iterdir()):
-            rel = str(entry.relative_to(root_path))
-            items.append(rel + ("/" if entry.is_dir() else ""))
-            if entry.is_dir():
-                _walk(entry, depth + 1)
+            continue
+        if note and depth == max_depth:
+            item = path + "/"
+        out.append(f"{name}/{item}")
+    return out
 
-    _walk(root_path, 0)
-    return items
+
+def list_parent_tree(
+    repo_dir: str, repo_tree: List[str], max_depth: int = 4, max_items: int = LIST_TREE_MAX_ITEMS,
+) -> List[str]:
+    """
+    list_tree(f"{repo_dir}/..") without walking the repo again: `repo_tree` is the
+    repo's own listing (list_tree or scan_repo) and only its siblings are listed here.
+    """
+    repo_dir = repo_dir.rstrip("/")
+    parent, name = os.path.dirname(repo_dir) or ".", os.path.basename(repo_dir)
+    items: List[str] = []
+    for entry in _sorted_entries(parent):
+        if len(items) >= max_items:
+            break
+        if not entry.is_dir(follow_symlinks=False):
+            items.append(entry.name)
+            continue
+        children = _sorted_entries(entry.path)
+        items.append(_tree_dir_item(entry.name, children))
+        if len(children) > LIST_TREE_DIR_MAX_ENTRIES or max_depth < 1:
+            continue
+        sub_tree = repo_tree if entry.name == name else list_tree(entry.path, max_depth, max_items)
+        items.extend(_nest_tree(entry.name, sub_tree, max_depth))
+    return items[:max_items]
 
 
 COMMON_HTTP_HINTS = [
@@ -81,6 +246,7 @@ COMMON_HTTP_HINTS = [
 ]
 
 
+# In priority order: within a file, an earlier pattern wins over a later one
 PORT_PATTERNS = [
     r"EXPOSE\s+(\d+)",
     r"ports:\s*\n\s*-\s*['\"]?(\d+):",
@@ -90,73 +256,458 @@ PORT_PATTERNS = [
     r"--port(?:=|\s+)(\d+)",
 ]
 
+# Each pattern list fused into one alternation so a file is scanned once.
+# Every port alternative has exactly one inner (\d+) group right after its named group.
+# Probes run on raw bytes to skip decoding source files.
+HTTP_PROBE = re.compile("|".join(f"(?P<h{i}>{p})" for i, p in enumerate(COMMON_HTTP_HINTS)).encode())
+PORT_PROBE = re.compile("|".join(f"(?P<p{i}>{p})" for i, p in enumerate(PORT_PATTERNS)).encode(), re.MULTILINE)
 
-def is_http_service(repo_dir: str) -> bool:
-    for root, _, files in os.walk(repo_dir):
-        for f in files:
-            if f.endswith((".py", ".js", ".ts", ".go", ".java", ".kt", ".rb", ".rs")) or f.lower() in ("dockerfile", "compose.yaml", "docker-compose.yml"):
-                try:
-                    path = os.path.join(root, f)
-                    with open(path, "r", errors="ignore") as fh:
-                        content = fh.read()
-                    if any(re.search(pat, content) for pat in COMMON_HTTP_HINTS):
-                        return True
-                except Exception:
-                    continue
-    return False
+
+def _build_http_hs_db():
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[p.encode() for p in COMMON_HTTP_HINTS],
+            ids=list(range(len(COMMON_HTTP_HINTS))),
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(COMMON_HTTP_HINTS),
+        )
+        return db
+    except Exception:
+        return None
 
 
-def infer_app_port(repo_dir: str, log: logging.Logger) -> int:
-    for root, _, files in os.walk(repo_dir):
-        for f in files:
-            if f.lower() in ("dockerfile", "docker-compose.yml", "compose.yaml", "compose.yml") or f.endswith((".py", ".js", ".ts", ".go")):
-                try:
-                    with open(os.path.join(root, f), "r", errors="ignore") as fh:
-                        content = fh.read()
-                    for pat in PORT_PATTERNS:
-                        m = re.search(pat, content, flags=re.MULTILINE)
-                        if m:
-                            port = int(m.group(1))
-                            if 1 <= port <= 65535:
-                                log.info("Inferred app port %s from %s", port, f)
-                                return port
-                except Exception:
-                    continue
+_HTTP_HS_DB = _build_http_hs_db()
+# A database shares one scratch space, so scans must not overlap across job threads
+_HTTP_HS_LOCK = threading.Lock()
+
+# Literals at least one of which every probe match contains; files without any are skipped
+# before touching the regex engine
+HTTP_PREFILTER = (
+    b"flask", b"fastapi", b"django", b"uvicorn", b"app.run(", b"express", b"app.listen(",
+    b"ListenAndServe(", b"@RestController", b"SpringApplication",
+)
+PORT_PREFILTER = (b"EXPOSE", b"port", b"listen(")
+# Server code pinned to loopback, which would be unreachable from outside the container
+LOCALHOST_BIND_RE = re.compile(
+    rb"app\.run\([^)]*host\s*=\s*['\"]127\.0\.0\.1['\"]"
+    rb"|host\s*=\s*['\"]localhost['\"]"
+    rb"|--host=127\.0\.0\.1"
+)
+# Every LOCALHOST_BIND_RE alternative contains one of these literals
+LOCALHOST_BIND_PREFILTER = (b"127.0.0.1", b"localhost")
+LOCALHOST_BIND_EXTS = (".py", ".js", ".ts")
+
+# Only the head of each file is scanned; minified bundles and data blobs can be huge
+SCAN_READ_MAX = 256 * 1024
+# Reads block in the kernel with the GIL released, so a few threads overlap them well
+SCAN_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+# Directories never worth scanning for service hints or rewriting: VCS data, vendored deps,
+# build output, tool state
+SCAN_SKIPPED_DIRS = frozenset({
+    ".git", "node_modules", ".venv", "venv", "vendor", "__pycache__",
+    "dist", "build", "target", ".next", ".terraform",
+})
+
+
+def _walk_files(root: str):
+    """
+    Yield os.DirEntry objects for files under root, pruning SCAN_SKIPPED_DIRS.
+    scandir hands back the entry type from the directory listing, so no per-file stat.
+    """
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SCAN_SKIPPED_DIRS:
+                            stack.append(entry.path)
+                    else:
+                        yield entry
+        except OSError:
+            continue
+
+
+def _read_head(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read(SCAN_READ_MAX)
+
+
+def _prefetch(fn: Callable[[Any], Any], items: List[Any]):
+    """
+    Yield (item, fn(item) or None on error) in input order while a thread pool
+    runs ahead. Closing the generator early stops pending calls.
+    """
+    stop = threading.Event()
+
+    def _call(item):
+        if stop.is_set():
+            return item, None
+        try:
+            return item, fn(item)
+        except Exception:
+            return item, None
+
+    ex = ThreadPoolExecutor(max_workers=SCAN_READ_WORKERS, thread_name_prefix="scan-read")
+    try:
+        yield from ex.map(_call, items)
+    finally:
+        stop.set()
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+def _read_files(entries: List[os.DirEntry]):
+    """Yield (entry, head bytes or None) in input order, reading ahead in parallel."""
+    return _prefetch(lambda e: _read_head(e.path), entries)
+
+
+# What each scanned file is probed for, looked up by case-sensitive extension,
+# then by lowercased file name
+_SCAN_HTTP, _SCAN_PORT, _SCAN_HINT = 1, 2, 4
+_SCAN_BY_EXT = {
+    ".py": _SCAN_HTTP | _SCAN_PORT | _SCAN_HINT,
+    ".js": _SCAN_HTTP | _SCAN_PORT | _SCAN_HINT,
+    ".ts": _SCAN_HTTP | _SCAN_PORT | _SCAN_HINT,
+    ".go": _SCAN_HTTP | _SCAN_PORT | _SCAN_HINT,
+    ".java": _SCAN_HTTP | _SCAN_HINT,
+    ".rb": _SCAN_HTTP | _SCAN_HINT,
+    ".kt": _SCAN_HTTP,
+    ".rs": _SCAN_HTTP,
+}
+_SCAN_BY_NAME = {
+    "dockerfile": _SCAN_HTTP | _SCAN_PORT,
+    "compose.yaml": _SCAN_HTTP | _SCAN_PORT,
+    "docker-compose.yml": _SCAN_HTTP | _SCAN_PORT,
+    "compose.yml": _SCAN_PORT,
+}
+
+
+def _scan_kind(name: str) -> int:
+    dot = name.rfind(".")
+    kind = _SCAN_BY_EXT.get(name[dot:]) if dot >= 0 else None
+    if kind is None:
+        kind = _SCAN_BY_NAME.get(name.lower(), 0)
+    return kind
+
+
+def _has_http_hint(content: bytes) -> bool:
+    if not any(tok in content for tok in HTTP_PREFILTER):
+        return False
+    if _HTTP_HS_DB is not None:
+        found = []
+
+        def _on_match(pattern_id, start, end, flags, context):
+            found.append(pattern_id)
+            return True  # stop at the first hit
+
+        try:
+            with _HTTP_HS_LOCK:
+                _HTTP_HS_DB.scan(content, match_event_handler=_on_match)
+        except Exception:
+            # Early termination surfaces as an error; anything else falls back to re
+            if not found:
+                return HTTP_PROBE.search(content) is not None
+        return bool(found)
+    return HTTP_PROBE.search(content) is not None
+
+
+def _binds_localhost(content: bytes) -> bool:
+    return any(tok in content for tok in LOCALHOST_BIND_PREFILTER) and LOCALHOST_BIND_RE.search(content) is not None
+
+
+def _best_port(content: bytes) -> Optional[Tuple[int, int]]:
+    """(pattern index, port) of the valid match from the highest-priority PORT_PATTERNS entry."""
+    if not any(tok in content for tok in PORT_PREFILTER):
+        return None
+    best = None
+    for m in PORT_PROBE.finditer(content):
+        idx = int(m.lastgroup[1:])  # type: ignore
+        if best is not None and idx >= best[0]:
+            continue
+        port = int(m.group(m.lastindex + 1))
+        if 1 <= port <= 65535:
+            best = (idx, port)
+            if idx == 0:
+                break
+    return best
+
+
+def _port_file_rank(name: str) -> int:
+    # Where a port is declared matters more than where it is found: Dockerfile > compose > code
+    lname = name.lower()
+    if lname == "dockerfile":
+        return 0
+    if lname in ("docker-compose.yml", "compose.yaml", "compose.yml"):
+        return 1
+    return 2
+
+
+class _PortPick:
+    """Keeps the highest-priority port seen so far across files (first seen wins ties)."""
+
+    def __init__(self):
+        self.rank: Optional[Tuple[int, int]] = None
+        self.port: Optional[int] = None
+        self.source: Optional[str] = None
+
+    def offer(self, name: str, content: bytes) -> None:
+        hit = _best_port(content)
+        if hit is None:
+            return
+        rank = (_port_file_rank(name), hit[0])
+        if self.rank is None or rank < self.rank:
+            self.rank, self.port, self.source = rank, hit[1], name
+
+    @property
+    def final(self) -> bool:
+        # A Dockerfile EXPOSE cannot be outranked
+        return self.rank == (0, 0)
+
+
+# Framework fallbacks, in priority order, used when no explicit port is found
+FRAMEWORK_PORT_HINTS = [
+    ("flask", 5000), ("fastapi", 8000), ("django", 8000),
+    ("express", 3000), ("next", 3000), ("rails", 3000), ("spring", 8080), ("go", 8080)
+]
+# One case-insensitive pass for all framework names; the lookahead keeps overlapping hits
+# (e.g. "go" inside "django") so the result matches per-name substring checks
+_FRAMEWORK_PROBE = re.compile(
+    b"(?=(" + b"|".join(re.escape(name.encode()) for name, _ in FRAMEWORK_PORT_HINTS) + b"))",
+    re.IGNORECASE,
+)
+
+
+def _frameworks_in(content: bytes) -> set:
+    return {m.group(1).lower().decode() for m in _FRAMEWORK_PROBE.finditer(content)}
+
+
+def _framework_port(framework_seen: set, log: logging.Logger) -> int:
     # Fallbacks by common frameworks
-    hints = [
-        ("flask", 5000), ("fastapi", 8000), ("django", 8000),
-        ("express", 3000), ("next", 3000), ("rails", 3000), ("spring", 8080), ("go", 8080)
-    ]
-    for name, port in hints:
-        for root, _, files in os.walk(repo_dir):
-            for f in files:
-                if f.endswith((".py", ".js", ".ts", ".rb", ".java", ".go")):
-                    try:
-                        with open(os.path.join(root, f), "r", errors="ignore") as fh:
-                            content = fh.read().lower()
-                        if name in content:
-                            log.info("Fallback inferred by framework %s: port %s", name, port)
-                            return port
-                    except Exception:
-                        continue
+    for name, port in FRAMEWORK_PORT_HINTS:
+        if name in framework_seen:
+            log.info("Fallback inferred by framework %s: port %s", name, port)
+            return port
     log.info("Could not infer port; defaulting to 8080")
     return 8080
 
 
-def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger):
+# Files always offered to the LLM as context (first LLM_CONTEXT_MAX_FILES found)
+LLM_CONTEXT_FILE_NAMES = frozenset({
+    "requirements.txt", "pyproject.toml", "Pipfile", "Pipfile.lock",
+    "package.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
+    "manage.py", "wsgi.py", "asgi.py",
+    "app.py", "main.py", "server.py", "run.py",
+    "Procfile", "Dockerfile", "README.md", "docker-compose.yml", "compose.yaml", "compose.yml",
+})
+LLM_CONTEXT_MAX_FILES = 40
+# Sources swept for HTTP hints when no app.py/main.py is among the context files
+LLM_HINT_SOURCE_EXTS = (".py", ".js", ".ts")
+
+
+# Heads of files read during the scan, kept for LLM context building (bounded memory)
+SCAN_CONTENT_CACHE_MAX = 40
+SCAN_CONTENT_CACHE_BYTES = 20000
+
+
+DOCKER_FILE_NAMES = frozenset({"dockerfile", "docker-compose.yml", "compose.yaml", "compose.yml"})
+
+
+class ScanResult(NamedTuple):
+    tree: List[str]
+    http_ok: bool
+    port: int
+    # path -> first SCAN_CONTENT_CACHE_BYTES bytes of files the scan already read
+    contents: Dict[str, bytes]
+    # Whether the repo already ships a Dockerfile or compose file
+    has_docker: bool
+    # Whether Python/JS/TS sources bind the server to loopback only
+    binds_localhost: bool
+    # LLM context candidates found by the walk: named files and hint-sweep sources
+    context_files: List[os.DirEntry]
+    source_files: List[os.DirEntry]
+
+
+def scan_repo(
+    repo_dir: str, log: logging.Logger, max_depth: int = 4, max_items: int = LIST_TREE_MAX_ITEMS,
+) -> ScanResult:
+    """
+    One sorted traversal producing the repo tree (as list_tree), whether it looks like an
+    HTTP service, its app port and whether it binds to loopback only, plus the LLM context
+    candidates, reading each source file at most once.
+    The tree keeps list_tree's limits and contents; probing skips SCAN_SKIPPED_DIRS.
+    """
+    root = repo_dir.rstrip("/") or "/"
+    prefix_len = len(root) if root.endswith("/") else len(root) + 1
+    tree: List[str] = []
+    http_ok = False
+    pick = _PortPick()
+    framework_seen = set()
+    contents: Dict[str, bytes] = {}
+    has_docker = False
+    binds_localhost = False
+    context_files: List[os.DirEntry] = []
+    source_files: List[os.DirEntry] = []
+
+    # Walk first (cheap, directory entries only), then read candidates in parallel
+    candidates: List[os.DirEntry] = []
+    root_candidates: List[os.DirEntry] = []
+    stack = [(e, 0, False, True) for e in reversed(_sorted_entries(root))]
+    while stack:
+        entry, depth, pruned, listed = stack.pop()
+        rel = entry.path[prefix_len:]
+        listed = listed and len(tree) < max_items
+        if not entry.is_dir(follow_symlinks=False):
+            if listed:
+                tree.append(rel)
+            if pruned:
+                continue
+            if len(context_files) < LLM_CONTEXT_MAX_FILES and entry.name in LLM_CONTEXT_FILE_NAMES and entry.is_file():
+                context_files.append(entry)
+            if entry.name.endswith(LLM_HINT_SOURCE_EXTS):
+                source_files.append(entry)
+            if _scan_kind(entry.name):
+                (root_candidates if depth == 0 else candidates).append(entry)
+                has_docker = has_docker or entry.name.lower() in DOCKER_FILE_NAMES
+            continue
+        child_pruned = pruned or entry.name in SCAN_SKIPPED_DIRS
+        child_listed = listed and depth < max_depth
+        # Keep descending for the tree listing, or past it for probing
+        children = _sorted_entries(entry.path) if child_listed or not child_pruned else []
+        if listed:
+            tree.append(_tree_dir_item(rel, children) if child_listed else rel + "/")
+        if child_listed and len(children) > LIST_TREE_DIR_MAX_ENTRIES:
+            child_listed = False
+            if child_pruned:
+                continue
+        stack.extend((e, depth + 1, child_pruned, child_listed) for e in reversed(children))
+
+    # Root files are read first, as in a top-down walk, so a root Dockerfile settles the port early
+    reads = _read_files(root_candidates + candidates)
+    try:
+        for entry, content in reads:
+            if http_ok and pick.final and binds_localhost:
+                break
+            if content is None:
+                continue
+            if len(contents) < SCAN_CONTENT_CACHE_MAX:
+                contents[entry.path] = content[:SCAN_CONTENT_CACHE_BYTES]
+            f = entry.name
+            # Loopback binding is checked on every source file, in the same read
+            if not binds_localhost and f.endswith(LOCALHOST_BIND_EXTS):
+                binds_localhost = _binds_localhost(content)
+            if http_ok and pick.final:
+                continue
+            kind = _scan_kind(f)
+            if not http_ok and kind & _SCAN_HTTP:
+                http_ok = _has_http_hint(content)
+            if not pick.final and kind & _SCAN_PORT:
+                pick.offer(f, content)
+            if pick.port is None and kind & _SCAN_HINT and len(framework_seen) < len(FRAMEWORK_PORT_HINTS):
+                framework_seen |= _frameworks_in(content)
+    finally:
+        reads.close()
+
+    if pick.port is not None:
+        log.info("Inferred app port %s from %s", pick.port, pick.source)
+        port = pick.port
+    else:
+        port = _framework_port(framework_seen, log)
+    return ScanResult(tree, http_ok, port, contents, has_docker, binds_localhost, context_files, source_files)
+
+
+# Lockfiles only tell the LLM which package manager and top dependencies are used:
+# send a one-line summary instead of their (token-heavy) contents
+LLM_SUMMARIZED_FILES = frozenset({"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "Pipfile.lock"})
+# Only parse lockfiles up to this size for dependency names; larger ones get size only
+LOCKFILE_PARSE_MAX = 8 << 20
+# README context is truncated to its head
+README_MAX_BYTES = 2048
+
+_YARN_ENTRY_RE = re.compile(r'^"?(@?[^@\s"]+)@', re.MULTILINE)
+_PNPM_DEPS_RE = re.compile(r"^( *)dependencies:\n((?:\1 +\S.*\n?)+)", re.MULTILINE)
+
+
+def _lockfile_deps(name: str, text: str) -> List[str]:
+    if name == "package-lock.json":
+        data = json.loads(text)
+        # lockfileVersion >= 2 records the root manifest under packages[""]
+        root = data.get("packages", {}).get("", {})
+        deps = root.get("dependencies") or data.get("dependencies") or {}
+        return list(deps)
+    if name == "Pipfile.lock":
+        return list(json.loads(text).get("default") or {})
+    if name == "pnpm-lock.yaml":
+        m = _PNPM_DEPS_RE.search(text)
+        if m is None:
+            return []
+        child = len(m.group(1)) + 2
+        return [
+            line.strip().split(":", 1)[0].strip("'\"")
+            for line in m.group(2).splitlines()
+            if len(line) - len(line.lstrip(" ")) == child
+        ]
+    # yarn.lock lists every resolved package, not just direct dependencies
+    return list(dict.fromkeys(_YARN_ENTRY_RE.findall(text)))
+
+
+def summarize_lockfile(path: str, size: int) -> str:
+    name = os.path.basename(path)
+    deps: List[str] = []
+    if size <= LOCKFILE_PARSE_MAX:
+        try:
+            with open(path, "r", errors="ignore") as fh:
+                deps = _lockfile_deps(name, fh.read())
+        except (OSError, ValueError, AttributeError):
+            deps = []
+    summary = f"<lockfile, {size} bytes"
+    if deps:
+        more = f", +{len(deps) - 5} more" if len(deps) > 5 else ""
+        summary += f", deps: {', '.join(deps[:5])}{more}"
+    return summary + ">"
+
+
+# One pass over generated compose files: `8080:${PORT}` mappings (group 1) and bare `${PORT}`
+_COMPOSE_PORT_RE = re.compile(r"(8080:)?\$\{(?:PORT|port)\}")
+
+
+def ensure_docker_assets(
+    repo_dir: str,
+    internal_port: int,
+    log: logging.Logger,
+    scan: ScanResult,
+    extra_generations: Optional[Dict[str, dict]] = None,
+) -> Dict[str, Any]:
     """
     Ensure dockerization per requirements
 
     Writes Dockerfile, docker-compose.yml, Makefile, and setup.sh one directory ABOVE the cloned repo.
     For example, if repo is at /workdir/repo, assets are written to /workdir.
+    `extra_generations` ({kind: context}) are sent in the same concurrent LLM batch as the
+    Dockerfile and setup.sh; their raw results (text or exception) are returned by kind.
+    `scan` is scan_repo's result for repo_dir: its tree, file heads and findings are reused.
     """
+    extra_generations = extra_generations or {}
     out_dir = os.path.dirname(os.path.abspath(repo_dir))
     dockerfile_path = os.path.join(out_dir, "Dockerfile")
     compose_path = os.path.join(out_dir, "docker-compose.yml")
     makefile_path = os.path.join(out_dir, "Makefile")
     setup_path = os.path.join(out_dir, "setup.sh")
 
+    file_cache = scan.contents
+
     def read_file_safe(p: str, max_bytes: int = 20000) -> str:
+        raw = file_cache.get(p)
+        if raw is not None:
+            # Same text as a text-mode read: lenient UTF-8 with universal newlines
+            text = raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+            # Usable if it holds the whole file or at least max_bytes characters
+            if len(raw) < SCAN_CONTENT_CACHE_BYTES or len(text) >= max_bytes:
+                return text[:max_bytes]
         try:
             with open(p, "r", errors="ignore") as fh:
                 data = fh.read(max_bytes)
@@ -165,96 +716,95 @@ def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger)
             return ""
 
     def collect_relevant_files(root: str) -> List[dict]:
-        candidates = [
-            "requirements.txt", "pyproject.toml", "Pipfile", "Pipfile.lock",
-            "package.json", "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
-            "manage.py", "wsgi.py", "asgi.py",
-            "app.py", "main.py", "server.py", "run.py",
-            "Procfile", "Dockerfile", "README.md", "docker-compose.yml", "compose.yaml", "compose.yml",
-        ]
         selected: List[dict] = []
-        root_path = Path(root)
-        # Prefer exact candidate names anywhere in tree (depth-limited)
-        for path in root_path.rglob("*"):
-            if len(selected) >= 40:
-                break
-            if path.is_file() and path.name in candidates:
-                rel = str(path.relative_to(root_path))
-                selected.append({"path": rel, "content": read_file_safe(str(path))})
+        prefix_len = len(root.rstrip("/")) + 1
+        # Exact candidate names (first 40) plus source files for the hint sweep, found by the scan
+        matches = scan.context_files
+        sources: Dict[str, List[os.DirEntry]] = {ext: [] for ext in LLM_HINT_SOURCE_EXTS}
+        for entry in scan.source_files:
+            sources[entry.name[entry.name.rfind("."):]].append(entry)
+
+        def _context(entry: os.DirEntry) -> dict:
+            rel = entry.path[prefix_len:]
+            if entry.name in LLM_SUMMARIZED_FILES:
+                return {"path": rel, "summary": summarize_lockfile(entry.path, entry.stat().st_size)}
+            max_bytes = README_MAX_BYTES if entry.name == "README.md" else 20000
+            return {"path": rel, "content": read_file_safe(entry.path, max_bytes) or ""}
+
+        for entry, item in _prefetch(_context, matches):
+            selected.append(item or {"path": entry.path[prefix_len:], "content": ""})
         # If no obvious python entry found, include a few .py or js/ts files that hint HTTP
         hints = ["flask", "fastapi", "django", "uvicorn", "app.run(", "listen(", "express", "springapplication.run("]
         if not any(x["path"].endswith(("app.py", "main.py")) for x in selected):
-            for glob_pat in ("*.py", "*.js", "*.ts"):
-                for path in root_path.rglob(glob_pat):
-                    if len(selected) >= 50:
-                        break
-                    try:
-                        txt = read_file_safe(str(path))
-                        low = txt.lower()
+            for ext in (".py", ".js", ".ts"):
+                if len(selected) >= 50:
+                    continue
+                reads = _prefetch(lambda e: read_file_safe(e.path), sources[ext])
+                try:
+                    for entry, txt in reads:
+                        if len(selected) >= 50:
+                            break
+                        low = (txt or "").lower()
                         if any(h in low for h in hints):
-                            rel = str(path.relative_to(root_path))
-                            selected.append({"path": rel, "content": txt})
-                    except Exception:
-                        continue
+                            selected.append({"path": entry.path[prefix_len:], "content": txt})
+                finally:
+                    reads.close()
         return selected
 
-    def detect_localhost_binding(root: str) -> bool:
-        patterns = [
-            r"app\.run\([^)]*host\s*=\s*['\"]127\.0\.0\.1['\"]",
-            r"host\s*=\s*['\"]localhost['\"]",
-            r"--host=127\.0\.0\.1",
-        ]
-        try:
-            for r, _, files in os.walk(root):
-                for f in files:
-                    if not f.endswith((".py", ".js", ".ts")):
-                        continue
-                    with open(os.path.join(r, f), "r", errors="ignore") as fh:
-                        txt = fh.read()
-                    for pat in patterns:
-                        if re.search(pat, txt):
-                            return True
-        except Exception:
-            return False
-        return False
+    # Whether the repo already uses Docker/Compose, and binds to loopback only
+    has_existing_docker = scan.has_docker
+    binds_localhost = scan.binds_localhost
 
-    # Discover whether the repo already uses Docker/Compose
-    has_existing_docker = False
-    for root, _, files in os.walk(repo_dir):
-        for f in files:
-            name_l = f.lower()
-            if name_l in ("dockerfile", "docker-compose.yml", "compose.yaml", "compose.yml"):
-                has_existing_docker = True
-                break
-        if has_existing_docker:
-            break
+    # The repo is not modified while assets are generated: list and read it once for all prompts
+    relevant_files = collect_relevant_files(repo_dir)
 
-    binds_localhost = detect_localhost_binding(repo_dir)
+    def list_workdir_tree() -> List[str]:
+        # Only the repo's siblings are listed again: the scan already holds its tree
+        return list_parent_tree(repo_dir, scan.tree, max_depth=4, max_items=500)
+
+    workdir_tree = list_workdir_tree()
+
+    # Dockerfile and setup.sh only share the repo context: generate them concurrently
+    llm_ctx = {
+        "objective": "Design a correct Dockerfile for the repository to run its HTTP service.",
+        "internal_port": internal_port,
+        "tree": workdir_tree,
+        "files": relevant_files,
+        "localhost_binding_detected": binds_localhost,
+        "require_bind_host": "0.0.0.0",
+    }
+    setup_ctx = {
+        "objective": "Generate an idempotent setup.sh to prepare the app (.env, migrations, keys) before running compose only if required.",
+        "tree": workdir_tree,
+        "files": relevant_files,
+        "localhost_binding_detected": binds_localhost,
+        "require_bind_host": "0.0.0.0",
+    }
+    batch = {"dockerfile": llm_ctx, "setup": setup_ctx, **extra_generations}
+    if LLM_BATCH_API and DRY_TERRAFORM_DEPLOYS:
+        # Dry runs are not interactive: trade latency for Batch API pricing
+        log.info("Submitting Dockerfile and setup.sh generation to the OpenAI Batch API...")
+        generated = generate_via_batch(batch)
+    else:
+        log.info("Requesting Dockerfile and setup.sh generation from OpenAI model...")
+        generated = asyncio.run(generate_all(batch))
 
     # Synthesize Dockerfile via LLM with fallback
     try:
-        llm_ctx = {
-            "objective": "Design a correct Dockerfile for the repository to run its HTTP service.",
-            "internal_port": internal_port,
-            "tree": list_tree(f"{repo_dir}/..", max_depth=4)[:500],
-            "files": collect_relevant_files(repo_dir),
-            "localhost_binding_detected": binds_localhost,
-            "require_bind_host": "0.0.0.0",
-        }
-        log.info("Requesting Dockerfile generation from OpenAI model...")
-        df_resp = generate_dockerfile_from_llm(llm_ctx)
+        df_resp = generated["dockerfile"]
+        if isinstance(df_resp, BaseException):
+            raise df_resp
         dockerfile_llm = extract_code_block(df_resp)
         def acceptable(df: str) -> bool:
+            # One lowercase copy; checks stop at the first failure
             s = df.lower()
-            conds = [
-                "from " in s,
-                (f"expose {internal_port}" in s or "expose ${port}" in s or "expose ${env:port}" in s),
-                ("cmd" in s or "entrypoint" in s),
-                ("```" not in df),
-            ]
-            if binds_localhost:
-                conds.append("0.0.0.0" in s)
-            return all(conds)
+            return (
+                "from " in s
+                and (f"expose {internal_port}" in s or "expose ${port}" in s or "expose ${env:port}" in s)
+                and ("cmd" in s or "entrypoint" in s)
+                and "```" not in df
+                and (not binds_localhost or "0.0.0.0" in s)
+            )
         if dockerfile_llm and acceptable(dockerfile_llm):
             with open(dockerfile_path, "w") as f:
                 f.write(dockerfile_llm.strip() + "\n")
@@ -265,18 +815,11 @@ def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger)
         log.warning("LLM Dockerfile generation failed (%s). Can't proceed.", e)
         raise e
 
-    # Generate setup.sh via LLM to prepare env/config before running compose via DinD
+    # Write setup.sh to prepare env/config before running compose via DinD
     try:
-        # Include README content if present at the repo root
-        setup_ctx = {
-            "objective": "Generate an idempotent setup.sh to prepare the app (.env, migrations, keys) before running compose only if required.",
-            "tree": list_tree(f"{repo_dir}/..", max_depth=4)[:500],
-            "files": collect_relevant_files(repo_dir),
-            "localhost_binding_detected": binds_localhost,
-            "require_bind_host": "0.0.0.0",
-        }
-        log.info("Requesting setup.sh generation from OpenAI model...")
-        setup_resp = generate_setup_script_from_llm(setup_ctx)
+        setup_resp = generated["setup"]
+        if isinstance(setup_resp, BaseException):
+            raise setup_resp
         setup_script = extract_code_block(setup_resp) or setup_resp
         if setup_script.strip() == "":
             raise RuntimeError("Empty setup.sh from LLM")
@@ -291,8 +834,8 @@ def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger)
         log.info("Wrote setup.sh from OpenAI suggestion")
     except Exception as e:
         log.warning("Failed to generate setup.sh from LLM: %s. Writing minimal placeholder.", e)
-        with open(setup_path, "w") as f:
-            f.write("#!/usr/bin/env bash\nset -euo pipefail\necho 'No setup required.'\n")
+        with open(setup_path, "wb") as f:
+            f.write(SETUP_PLACEHOLDER_BYTES)
         try:
             os.chmod(setup_path, 0o755)
         except Exception:
@@ -302,8 +845,9 @@ def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger)
     compose_ctx = {
         "objective": "Generate docker-compose.yml for the repository as per instructions provided.",
         "internal_port": internal_port,
-        "tree": list_tree(f"{repo_dir}/..", max_depth=4)[:500],
-        "files": collect_relevant_files(repo_dir),
+        # Relisted: the workdir now also holds the generated Dockerfile and setup.sh
+        "tree": list_workdir_tree(),
+        "files": relevant_files,
         "top_level_dockerfile": dockerfile_llm,
         "localhost_binding_detected": binds_localhost,
         "require_bind_host": "0.0.0.0",
@@ -315,20 +859,59 @@ def ensure_docker_assets(repo_dir: str, internal_port: int, log: logging.Logger)
         raise RuntimeError("LLM compose did not include services block")
     # Avoid Compose-time variable interpolation issues: never keep ${PORT} in YAML
     # Replace ${PORT} with $$PORT for runtime shell expansion, and fix port mappings
-    compose_yaml = compose_yaml.replace("${PORT}", "$$PORT").replace("${port}", "$$PORT")
-    compose_yaml = compose_yaml.replace("8080:${PORT}", f"8080:{internal_port}").replace("8080:${port}", f"8080:{internal_port}")
+    compose_yaml = _COMPOSE_PORT_RE.sub(
+        lambda m: f"8080:{internal_port}" if m.group(1) else "$$PORT", compose_yaml
+    )
     with open(compose_path, "w") as f:
         f.write(compose_yaml.strip() + "\n")
 
     # Write Makefile (updated to run setup.sh if present)
-    with open(makefile_path, "w") as f:
-        f.write(MAKEFILE_TEMPLATE)
+    with open(makefile_path, "wb") as f:
+        f.write(MAKEFILE_TEMPLATE_BYTES)
 
     log.info(
         "Containerization assets written/updated: %s%s docker-compose.yml, Makefile",
         "Dockerfile, " if not has_existing_docker else "",
         "setup.sh, " if has_existing_docker else "",
     )
+    return {kind: generated[kind] for kind in extra_generations}
+
+
+# Repo-wide rewrite applied to ALL text files, as one compiled pattern and one subn per file
+# (extend the alternation to add rewrites). For now: avoid fixed address/port code for them to default to /
+# Files are handled as bytes throughout: nothing is decoded, and line endings or
+# non-UTF-8 bytes outside the matches are written back untouched.
+REPO_REWRITE_RE = re.compile(rb"http(s)?:\/\/localhost:[0-9]{1,5}\b")
+REPO_REWRITE_REPL = b""
+# Larger files are screened through a read-only mmap instead of being copied into memory
+REWRITE_MMAP_MIN = 4096
+
+
+def _rewrite_candidate(path: str) -> bool:
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size < REWRITE_MMAP_MIN:
+            data = fh.read()
+            return b"\x00" not in data[:2048] and b"localhost:" in data and REPO_REWRITE_RE.search(data) is not None
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if b"\x00" in mm[:2048]:
+                return False  # binary file
+            return mm.find(b"localhost:") >= 0 and REPO_REWRITE_RE.search(mm) is not None
+
+
+def _rewrite_file(fpath: str) -> int:
+    # Skip obvious binaries and large blobs
+    if os.path.getsize(fpath) > 2 * 1024 * 1024:
+        return 0
+    if not _rewrite_candidate(fpath):
+        return 0
+    with open(fpath, "rb") as fhr:
+        original = fhr.read()
+    updated, replacements_here = REPO_REWRITE_RE.subn(REPO_REWRITE_REPL, original)
+    if replacements_here > 0 and updated != original:
+        with open(fpath, "wb") as fhw:
+            fhw.write(updated)
+        return replacements_here
+    return 0
 
 
 def apply_repo_rewrites(repo_dir: str, log: logging.Logger) -> None:
@@ -336,44 +919,17 @@ def apply_repo_rewrites(repo_dir: str, log: logging.Logger) -> None:
     Edit web app code if obvious patterns to replace
     """
     try:
-        # Define repo-wide, regex-based rewrites (easy to extend). Applied to ALL text files.
-        # For now: avoid fixed address/port code for them to default to /
-        rewrite_patterns: List[tuple[re.Pattern[str], str]] = [
-            (re.compile(r"http(s)?:\/\/localhost:[0-9]{1,5}\b"), ""),
-        ]
-
-        skipped_dirs = {".git", "node_modules", ".venv", "venv", "dist", "build", "__pycache__", ".terraform"}
         files_changed = 0
         total_replacements = 0
 
-        for root, dirs, files in os.walk(repo_dir):
-            # Prune heavy/irrelevant directories in-place
-            dirs[:] = [d for d in dirs if d not in skipped_dirs]
-            for fname in files:
-                fpath = os.path.join(root, fname)
-                try:
-                    # Skip obvious binaries and large blobs
-                    if os.path.getsize(fpath) > 2 * 1024 * 1024:
-                        continue
-                    with open(fpath, "rb") as fhb:
-                        chunk = fhb.read(2048)
-                        if b"\x00" in chunk:
-                            continue  # binary file
-                    with open(fpath, "r", errors="ignore") as fhr:
-                        original = fhr.read()
-                    updated = original
-                    replacements_here = 0
-                    for pat, repl in rewrite_patterns:
-                        updated, n = pat.subn(repl, updated)
-                        replacements_here += n
-                    if replacements_here > 0 and updated != original:
-                        with open(fpath, "w") as fhw:
-                            fhw.write(updated)
-                        files_changed += 1
-                        total_replacements += replacements_here
-                except Exception:
-                    # Best-effort; continue
-                    continue
+        # Same pruned walk as the scan helpers (heavy/irrelevant directories skipped)
+        paths = [entry.path for entry in _walk_files(repo_dir)]
+        # Files are independent and mostly I/O: screen and rewrite them on the read-ahead pool.
+        # Best-effort: a file that fails counts as unchanged
+        for _, replacements_here in _prefetch(_rewrite_file, paths):
+            if replacements_here:
+                files_changed += 1
+                total_replacements += replacements_here
         if total_replacements > 0:
             log.info("Applied %d replacements across %d file(s) to normalize localhost ports.", total_replacements, files_changed)
         else:
@@ -382,39 +938,182 @@ def apply_repo_rewrites(repo_dir: str, log: logging.Logger) -> None:
         log.warning("Failed applying repo-wide rewrites: %s", e)
 
 
-def archive_repo(src_dir: str, dest_tar: str):
-    with tarfile.open(dest_tar, "w:gz") as tar:
-        tar.add(src_dir, arcname="app")
+# Source trees compress well enough at level 1, which is several times faster than 9
+ARCHIVE_GZIP_LEVEL = 1
+ARCHIVE_STREAM_BUFSIZE = 1 << 20
+# VCS metadata and bytecode caches are never needed on the instance
+ARCHIVE_SKIPPED_DIRS = frozenset({".git", "__pycache__"})
+# Loose bytecode outside __pycache__ (Python 2 layout, committed by mistake)
+ARCHIVE_SKIPPED_SUFFIXES = (".pyc", ".pyo")
 
 
-TERRAFORM_HINTS = TERRAFORM_HINTS_TEMPLATE.format(instance_type=DEFAULT_AWS_INSTANCE)
+def archive_repo(src_dir: str, dest_tar: str, exclude: Tuple[str, ...] = ()):
+    """
+    Pack src_dir as app/ into a gzipped tarball. Uses tar piped into pigz (parallel
+    gzip, fast level) when both are installed, else the tarfile module.
+    `exclude` lists paths relative to src_dir to leave out; the archive itself is
+    excluded too when it is written inside src_dir.
+    """
+    src_dir = os.path.abspath(src_dir)
+    dest_abs = os.path.abspath(dest_tar)
+    rel_dest = os.path.relpath(dest_abs, src_dir)
+    excluded = set(exclude)
+    if not rel_dest.startswith(".."):
+        excluded.add(rel_dest)
 
+    if shutil.which("tar") and shutil.which("pigz"):
+        # Rename members (r) and the hardlink targets that name them (h), never symlink
+        # targets: those are paths on disk and must stay as written
+        tar_cmd = ["tar", "-cf", "-", "-C", src_dir, r"--transform=flags=rh;s,^\.,app,"]
+        tar_cmd += [f"--exclude=./{rel}" for rel in sorted(excluded)]
+        tar_cmd += [f"--exclude={d}" for d in sorted(ARCHIVE_SKIPPED_DIRS)]
+        tar_cmd += [f"--exclude=*{suffix}" for suffix in ARCHIVE_SKIPPED_SUFFIXES]
+        tar_cmd.append(".")
+        with open(dest_tar, "wb") as out:
+            tar = subprocess.Popen(tar_cmd, stdout=subprocess.PIPE)
+            pigz = subprocess.Popen(["pigz", f"-{ARCHIVE_GZIP_LEVEL}", "-p", str(os.cpu_count() or 2)], stdin=tar.stdout, stdout=out)
+            tar.stdout.close()  # type: ignore
+            pigz_rc = pigz.wait()
+            tar_rc = tar.wait()
+        if tar_rc != 0 or pigz_rc != 0:
+            raise RuntimeError(f"Archiving {src_dir} failed (tar code {tar_rc}, pigz code {pigz_rc})")
+        return
 
-def terraform_fallback_main_tf(name_suffix: str) -> str:
-    # Fallback Terraform minimizing IAM requirements: no aws_key_pair, no SG egress management
-    tf = TERRAFORM_FALLBACK_TEMPLATE.format(
-        instance_type=DEFAULT_AWS_INSTANCE,
-        name_suffix=name_suffix,
-        ami_data_snippet=AMI_DATA_SNIPPET,
-        remote_exec_snippet=REMOTE_EXEC_SNIPPET
-    )
-    # Ensure Docker service is started before attempting compose usage
+    def _skip(ti: tarfile.TarInfo):
+        if ti.name[len("app/"):] in excluded:
+            return None
+        if ti.isfile() and ti.name.endswith(ARCHIVE_SKIPPED_SUFFIXES):
+            return None
+        return None if os.path.basename(ti.name) in ARCHIVE_SKIPPED_DIRS else ti
+
+    # Single-pass stream ("w|") through a fast gzip level; tarfile's own
+    # stream mode does not take a compresslevel before Python 3.12
+    with gzip.GzipFile(dest_tar, "wb", compresslevel=ARCHIVE_GZIP_LEVEL) as gz:
+        # Large stream buffer: fewer, bigger writes into the compressor
+        with tarfile.open(fileobj=gz, mode="w|", bufsize=ARCHIVE_STREAM_BUFSIZE) as tar:
+            tar.add(src_dir, arcname="app", filter=_skip)
+
+
+# Content-addressed cache of pre-Terraform results per repo commit: tree, port, the generated
+# workdir assets, the accepted Terraform and, once a real deploy built it, the archive.
+# Set ARTIFACT_CACHE_DIR to an empty string to disable.
+ARTIFACT_CACHE_DIR = os.environ.get("ARTIFACT_CACHE_DIR", "/data/autodeploy/.artifact_cache")
+# Bump when the pre-Terraform pipeline changes what it produces for a given commit
+ARTIFACT_CACHE_VERSION = "2"
+# Files ensure_docker_assets writes next to the repo
+CACHED_ASSET_NAMES = ("Dockerfile", "docker-compose.yml", "Makefile", "setup.sh")
+
+
+class CachedArtifacts(NamedTuple):
+    tree: List[str]
+    port: int
+    # Policy-accepted Terraform with TF_JOB_ID_PLACEHOLDER, or None when the template was used
+    terraform: Optional[str]
+    # terraform_prompt_key of the prompt it answered: reused only for an identical prompt
+    # (same description, tree and port)
+    terraform_key: Optional[str]
+
+
+def terraform_prompt_key(prompt: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(prompt, sort_keys=True).encode()).hexdigest()
+
+
+def artifact_cache_dir(repo_url: str, head_sha: Optional[str]) -> Optional[str]:
+    if not ARTIFACT_CACHE_DIR or not head_sha:
+        return None
+    key = hashlib.sha256(f"{ARTIFACT_CACHE_VERSION}\0{repo_url}\0{head_sha}".encode()).hexdigest()[:16]
+    return os.path.join(ARTIFACT_CACHE_DIR, key)
+
+
+def load_cached_artifacts(cache_dir: Optional[str], workdir: str, tar_path: str) -> Optional[CachedArtifacts]:
+    """
+    Restore a cache entry into workdir. The archive is optional (dry runs never build
+    one): when it is missing, tar_path is left absent for the caller to build.
+    """
+    if cache_dir is None:
+        return None
     try:
-        tf = re.sub(
-            r'(\"cd /opt/app && sudo -n make up\",)',
-            '\"sudo -n systemctl enable --now docker\",\n      \\1',
-            tf,
-        )
+        with open(os.path.join(cache_dir, "meta.json")) as fh:
+            meta = json.load(fh)
+        for name in meta["assets"]:
+            shutil.copy2(os.path.join(cache_dir, name), os.path.join(workdir, name))
+        cached_tar = os.path.join(cache_dir, "app.tar.gz")
+        if os.path.exists(cached_tar):
+            _link_or_copy(cached_tar, tar_path)
+        return CachedArtifacts(meta["tree"], int(meta["port"]), meta.get("terraform"), meta.get("terraform_key"))
     except Exception:
+        return None
+
+
+def store_cached_artifacts(
+    cache_dir: Optional[str], workdir: str, tar_path: str, artifacts: CachedArtifacts, log: logging.Logger,
+):
+    if cache_dir is None:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        suffix = f".{os.getpid()}.{threading.get_ident()}"
+        # Files first, metadata last: meta.json marks a complete entry
+        assets = [name for name in CACHED_ASSET_NAMES if os.path.exists(os.path.join(workdir, name))]
+        for name in assets:
+            tmp = os.path.join(cache_dir, f".{name}{suffix}")
+            shutil.copy2(os.path.join(workdir, name), tmp)
+            os.replace(tmp, os.path.join(cache_dir, name))
+        if os.path.exists(tar_path):
+            tmp_tar = os.path.join(cache_dir, f".app.tar.gz{suffix}")
+            _link_or_copy(tar_path, tmp_tar)
+            os.replace(tmp_tar, os.path.join(cache_dir, "app.tar.gz"))
+        tmp_meta = os.path.join(cache_dir, f".meta.json{suffix}")
+        with open(tmp_meta, "w") as fh:
+            json.dump({**artifacts._asdict(), "assets": assets}, fh)
+        os.replace(tmp_meta, os.path.join(cache_dir, "meta.json"))
+    except Exception as e:
+        log.warning("Failed to cache artifacts in %s: %s", cache_dir, e)
+
+
+def _link_or_copy(src: str, dst: str):
+    # The archive is never modified after packing: share it instead of re-streaming it
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
         pass
-    return tf
+    try:
+        subprocess.run(["cp", "--reflink=auto", src, dst], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception:
+        shutil.copy2(src, dst)
+
+
+TERRAFORM_HINTS = TERRAFORM_HINTS_RENDER(instance_type=DEFAULT_AWS_INSTANCE)
+
+
+def terraform_fallback_main_tf(name_suffix: str) -> str:
+    # Fallback Terraform minimizing IAM requirements: no aws_key_pair, no SG egress management.
+    # REMOTE_EXEC_SNIPPET already starts Docker before `make up`, so the text is used as rendered.
+    return render_terraform_fallback(DEFAULT_AWS_INSTANCE, name_suffix)
+
+
+# First fenced code block of any language in an LLM response
+def _first_fenced_block(text: str) -> Optional[str]:
+    # Body of the first ```-fenced block: the opening fence runs to the end of its line and
+    # the block ends at the next line starting with ```. Plain str.find, no regex engine
+    start = text.find("```")
+    if start < 0:
+        return None
+    body = text.find("\n", start + 3) + 1
+    if body == 0:
+        return None
+    end = text.find("\n```", body)
+    if end < 0:
+        return None
+    return text[body:end]
 
 
 def extract_code_block(text: str) -> str:
     # Extract the first fenced code block of any language. Fallback: strip fences if present.
-    m = re.search(r"```[^\n]*\n([\s\S]*?)\n```", text)
-    if m:
-        return m.group(1)
+    block = _first_fenced_block(text)
+    if block is not None:
+        return block
     stripped = text.strip()
     lines = stripped.splitlines()
     if len(lines) >= 2 and lines[0].startswith("```") and lines[-1].startswith("```"):
@@ -422,32 +1121,38 @@ def extract_code_block(text: str) -> str:
     # Also strip surrounding triple quotes if they wrap a fenced block
     if len(lines) >= 4 and lines[0].startswith('"""') and lines[-1].startswith('"""'):
         inner = "\n".join(lines[1:-1]).strip()
-        m2 = re.search(r"```[^\n]*\n([\s\S]*?)\n```", inner)
-        if m2:
-            return m2.group(1)
+        block = _first_fenced_block(inner)
+        if block is not None:
+            return block
         return inner
     return stripped
 
+# Policy tokens for LLM Terraform, matched in one pass. Group 1 is forbidden, the rest are required:
+# 1 aws_key_pair (no key pair resources), 2 egress (explicit outbound access), 3 tls_private_key,
+# 4 our target instance type, 5 the archive upload path (case-sensitive), 6 `make up`
+_TF_POLICY_RE = re.compile(
+    r"(aws_key_pair)|(egress)|(tls_private_key)|(" + re.escape(DEFAULT_AWS_INSTANCE) + r")"
+    r"|(?-i:(/home/ubuntu/app\.tar\.gz))|(make up)",
+    re.IGNORECASE,
+)
+_TF_POLICY_REQUIRED = frozenset(range(2, 7))
+
+
 def is_llm_tf_acceptable(code: str) -> bool:
-    code_l = code.lower()
-    # Disallow use of aws_key_pair and explicit egress rules
-    if "aws_key_pair" in code_l:
-        return False
-    # Require explicit outbound egress to ensure internet access
-    if "egress" not in code_l:
-        return False
-    # Require tls_private_key and user_data presence
-    if "tls_private_key" not in code_l:
-        return False
-    # Require our target instance family to reduce surprises
-    if DEFAULT_AWS_INSTANCE not in code_l:
-        return False
-    # Must upload to /home/ubuntu/app.tar.gz and run make up
-    if "/home/ubuntu/app.tar.gz" not in code:
-        return False
-    if "make up" not in code_l:
-        return False
-    return True
+    seen = set()
+    for m in _TF_POLICY_RE.finditer(code):
+        if m.lastindex == 1:
+            return False
+        seen.add(m.lastindex)
+    return seen >= _TF_POLICY_REQUIRED
+
+
+# The output block the id_rsa local_file is inserted before; only searched when the name appears
+_TF_PUBLIC_IP_OUTPUT_RE = re.compile(r"^\s*output\s+\"public_ip\"", re.MULTILINE)
+
+# The LLM sees this placeholder instead of the per-job id, so the Terraform prompt (and its
+# LLM cache key) is identical for repeat deploys; the real id is substituted into the result
+TF_JOB_ID_PLACEHOLDER = "__JOB_ID_SHORT__"
 
 
 def process_deploy_request(job_manager: JobManager, job_id: str, description: str, repo_url: str, workdir: str):
@@ -456,69 +1161,100 @@ def process_deploy_request(job_manager: JobManager, job_id: str, description: st
 
     repo_dir = os.path.join(workdir, "repo")
     os.makedirs(repo_dir, exist_ok=True)
-    clone_repo(repo_url, repo_dir, log)
-
-    tree = list_tree(repo_dir, max_depth=4)
-    log.info("Repository tree (max depth 4):\n%s", "\n".join(tree))
+    head_sha = clone_repo(repo_url, repo_dir, log)
 
-    if not is_http_service(repo_dir):
-        raise RuntimeError("Denied: repository does not appear to expose an HTTP-accessible server.")
-
-    port = infer_app_port(repo_dir, log)
-
-    ensure_docker_assets(repo_dir, port, log)
-    apply_repo_rewrites(repo_dir, log)
-
-    # Prepare archive to transfer
     tar_path = os.path.join(workdir, "app.tar.gz")
-    archive_repo(workdir, tar_path)
-    log.info("Prepared project archive: %s", tar_path)
+    cache_dir = artifact_cache_dir(repo_url, head_sha)
+    cached = load_cached_artifacts(cache_dir, workdir, tar_path)
+    if cached is not None:
+        tree, port = cached.tree, cached.port
+        log.info("Reusing cached artifacts for %s@%s (port %s)", repo_url, head_sha, port)
+        log.info("Repository tree (max depth 4):\n%s", "\n".join(tree))
+    else:
+        scan = scan_repo(repo_dir, log, max_depth=4, max_items=500)
+        tree, port = scan.tree, scan.port
+        log.info("Repository tree (max depth 4):\n%s", "\n".join(tree))
 
-    # Ask LLM to generate Terraform
+        if not scan.http_ok:
+            raise RuntimeError("Denied: repository does not appear to expose an HTTP-accessible server.")
+
+    short_id = job_id[:8]
+    # Terraform prompt only needs the tree and port, so it can ride along with the Docker assets
     prompt = {
         "objective": "Generate Terraform to deploy a GitHub repo on AWS EC2 and run via Docker compose.",
         "inputs": {
             "description": description,
             "repo_url": repo_url,
-            "repo_tree": tree[:500],
+            "repo_tree": tree,
             "port": port,
             "tar_name": os.path.basename(tar_path),
-            "job_id_short": (job_id.split("-")[0] or job_id)[:8],
+            "job_id_short": TF_JOB_ID_PLACEHOLDER,
         },
-        "requirements": TERRAFORM_HINTS_TEMPLATE.format(instance_type=DEFAULT_AWS_INSTANCE),
+        "requirements": TERRAFORM_HINTS,
         "output": "Provide a single main.tf file content in a fenced code block.",
     }
 
-    log.info("Requesting Terraform generation from OpenAI model...")
-    llm_resp = None
-    try:
-        llm_resp = generate_terraform_from_llm(prompt)
-        log.info("Received LLM response")
-    except Exception as e:
-        log.warning("OpenAI call failed, falling back to built-in Terraform template: %s", e)
+    # A cache hit reuses the accepted Terraform as is when it answered this exact prompt. Otherwise
+    # (another description, or the template was used) the LLM is asked again, with the same
+    # template fallback as a first deploy
+    prompt_key = terraform_prompt_key(prompt)
+    reuse_tf = cached is not None and cached.terraform is not None and cached.terraform_key == prompt_key
+    tf_code = cached.terraform if reuse_tf else None
+    if tf_code is not None:
+        log.info("Reusing cached Terraform")
+    else:
+        llm_resp = None
+        llm_error: Optional[BaseException] = None
+        if cached is None:
+            log.info("Requesting Terraform generation from OpenAI model alongside Docker assets...")
+            extra = ensure_docker_assets(
+                repo_dir, port, log, scan, extra_generations={"terraform": prompt},
+            )
+            apply_repo_rewrites(repo_dir, log)
+            tf_result = extra["terraform"]
+            if isinstance(tf_result, BaseException):
+                llm_error = tf_result
+            else:
+                llm_resp = tf_result
+        else:
+            log.info("Requesting Terraform generation from OpenAI model...")
+            try:
+                llm_resp = generate_terraform_from_llm(prompt)
+            except Exception as e:
+                llm_error = e
+        if llm_error is not None:
+            log.warning("OpenAI call failed, falling back to built-in Terraform template: %s", llm_error)
+        else:
+            log.info("Received LLM response")
+        if llm_resp and isinstance(llm_resp, str):
+            code = extract_code_block(llm_resp)
+            if code and is_llm_tf_acceptable(code):
+                tf_code = code
+            else:
+                log.info("LLM Terraform rejected by policy; using fallback template")
+
+    built_archive = False
+    if os.path.exists(tar_path):
+        log.info("Prepared project archive: %s", tar_path)
+    elif DRY_TERRAFORM_DEPLOYS:
+        # `terraform plan` never runs the file provisioner: dry runs ship an empty stub instead
+        log.info("Dry run: skipping project archive")
+    else:
+        if cached is not None:
+            # Partial hit (cached by a dry run): the fresh clone still needs the rewrites
+            apply_repo_rewrites(repo_dir, log)
+        # The job log lives in workdir but is not shipped
+        archive_repo(workdir, tar_path, (JOB_LOG_FILENAME, "terraform"))
+        built_archive = True
+        log.info("Prepared project archive: %s", tar_path)
 
     terraform_dir = os.path.join(workdir, "terraform")
     os.makedirs(terraform_dir, exist_ok=True)
 
-    main_tf = None
-    if llm_resp and isinstance(llm_resp, str):
-        code = extract_code_block(llm_resp)
-        if code and is_llm_tf_acceptable(code):
-            main_tf = code
-        else:
-            log.info("LLM Terraform rejected by policy; using fallback template")
-    if not main_tf:
-        short_id = (job_id.split("-")[0] or job_id)[:8]
+    if tf_code is not None:
+        main_tf = tf_code.replace(TF_JOB_ID_PLACEHOLDER, short_id)
+    else:
         main_tf = terraform_fallback_main_tf(short_id)
-        # Also ensure Docker service start in fallback (defense in depth)
-        try:
-            main_tf = re.sub(
-                r'(\"cd /opt/app && sudo -n make up\",)',
-                '\"sudo -n systemctl enable --now docker\",\n      \\1',
-                main_tf,
-            )
-        except Exception:
-            pass
 
     # Ensure the generated SSH private key is persisted locally as id_rsa for later SSH access
     def _ensure_local_private_key(tf_code: str) -> str:
@@ -535,8 +1271,7 @@ def process_deploy_request(job_manager: JobManager, job_id: str, description: st
                 '}\n\n'
             )
             # Prefer inserting before the first output block if present to keep outputs last
-            import re as _re
-            m = _re.search(r"^\s*output\s+\"public_ip\"", tf_code, flags=_re.MULTILINE)
+            m = _TF_PUBLIC_IP_OUTPUT_RE.search(tf_code) if '"public_ip"' in tf_code else None
             if m:
                 idx = m.start()
                 return tf_code[:idx] + local_file_block + tf_code[idx:]
@@ -549,15 +1284,28 @@ def process_deploy_request(job_manager: JobManager, job_id: str, description: st
     with open(os.path.join(terraform_dir, "main.tf"), "w") as f:
         f.write(main_tf)
     # Place archive next to TF for file provisioner
-    shutil.copy2(tar_path, os.path.join(terraform_dir, os.path.basename(tar_path)))
+    tf_tar_path = os.path.join(terraform_dir, os.path.basename(tar_path))
+    if os.path.exists(tar_path):
+        _link_or_copy(tar_path, tf_tar_path)
+    else:
+        open(tf_tar_path, "wb").close()
 
     log.info("Executing Terraform init/apply in %s", terraform_dir)
 
     # Run terraform commands; expect terraform binary to be available in container
-    run(["terraform", "init"], cwd=terraform_dir, log=log)
+    tf_env = terraform_env()
+    with _TF_INIT_LOCK:
+        run(["terraform", "init"], cwd=terraform_dir, log=log, env=tf_env)
     if DRY_TERRAFORM_DEPLOYS:
-      run(["terraform", "plan", "-out=tfplan"], cwd=terraform_dir, log=log)
+      run(["terraform", "plan", "-out=tfplan"], cwd=terraform_dir, log=log, env=tf_env)
     else:
-      run(["terraform", "apply", "-auto-approve"], cwd=terraform_dir, log=log)
+      run(["terraform", "apply", "-auto-approve"], cwd=terraform_dir, log=log, env=tf_env)
+
+    # Cache only what Terraform accepted: a failed deploy must be able to regenerate everything
+    if cached is None or built_archive or (tf_code is not None and not reuse_tf):
+        store_cached_artifacts(
+            cache_dir, workdir, tar_path,
+            CachedArtifacts(tree, port, tf_code, prompt_key if tf_code is not None else None), log,
+        )
 
     log.info("Deployment requested. Monitor AWS resources and app at port 8080.")
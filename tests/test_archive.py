@@ -0,0 +1,68 @@
+import os
+import shutil
+import stat
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+from app.worker import archive_repo
+
+
+class ArchiveRepoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "src")
+        os.makedirs(os.path.join(self.src, "sub"))
+        with open(os.path.join(self.src, ".env.sample"), "w") as f:
+            f.write("PORT=8080\n")
+        with open(os.path.join(self.src, "sub", "a"), "w") as f:
+            f.write("a\n")
+        os.symlink(".env.sample", os.path.join(self.src, "l2"))
+        os.symlink("./sub/a", os.path.join(self.src, "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _assert_links_kept(self, dest_tar):
+        with tarfile.open(dest_tar) as tar:
+            members = {m.name: m for m in tar.getmembers()}
+        self.assertIn("app/.env.sample", members)
+        self.assertTrue(members["app/l2"].issym())
+        self.assertEqual(members["app/l2"].linkname, ".env.sample")
+        self.assertTrue(members["app/link"].issym())
+        self.assertEqual(members["app/link"].linkname, "./sub/a")
+
+    def test_relative_symlinks_with_tarfile(self):
+        dest_tar = os.path.join(self.tmp, "app.tar.gz")
+        with mock.patch("app.worker.shutil.which", return_value=None):
+            archive_repo(self.src, dest_tar)
+        self._assert_links_kept(dest_tar)
+
+    @unittest.skipUnless(shutil.which("tar") and shutil.which("gzip"), "needs tar and gzip")
+    def test_relative_symlinks_with_tar_and_pigz(self):
+        # Stand-in pigz: same stream contract (stdin -> gzip stdout), single-threaded
+        bin_dir = os.path.join(self.tmp, "bin")
+        os.makedirs(bin_dir)
+        pigz = os.path.join(bin_dir, "pigz")
+        with open(pigz, "w") as f:
+            f.write("#!/bin/sh\nexec gzip -c -1\n")
+        os.chmod(pigz, os.stat(pigz).st_mode | stat.S_IEXEC)
+        os.link(os.path.join(self.src, "sub", "a"), os.path.join(self.src, "hard"))
+
+        dest_tar = os.path.join(self.tmp, "app.tar.gz")
+        with mock.patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", "")}):
+            archive_repo(self.src, dest_tar)
+        self._assert_links_kept(dest_tar)
+
+        # Hardlink targets are member names and must follow the app/ rename
+        out_dir = os.path.join(self.tmp, "out")
+        os.makedirs(out_dir)
+        with tarfile.open(dest_tar) as tar:
+            tar.extractall(out_dir)
+        for name in ("l2", "link", "hard"):
+            self.assertTrue(os.path.exists(os.path.join(out_dir, "app", name)), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.worker import _lockfile_deps, summarize_lockfile
+
+PNPM_V5 = """\
+lockfileVersion: 5.4
+
+specifiers:
+  '@types/node': ^18.0.0
+  express: ^4.18.2
+
+dependencies:
+  '@types/node': 18.0.0
+  express: 4.18.2
+
+packages:
+
+  /express/4.18.2:
+    resolution: {integrity: sha512-x}
+    dependencies:
+      accepts: 1.3.8
+      body-parser: 1.20.1
+    dev: false
+"""
+
+PNPM_V6 = """\
+lockfileVersion: '6.0'
+
+dependencies:
+  '@nestjs/core':
+    specifier: ^10.0.0
+    version: 10.0.0
+  express:
+    specifier: ^4.18.2
+    version: 4.18.2
+
+devDependencies:
+  typescript:
+    specifier: ^5.0.0
+    version: 5.0.4
+
+packages:
+
+  /accepts@1.3.8:
+    resolution: {integrity: sha512-y}
+    dependencies:
+      mime-types: 2.1.35
+"""
+
+YARN_V1 = """\
+# THIS IS AN AUTOGENERATED FILE. DO NOT EDIT THIS FILE DIRECTLY.
+# yarn lockfile v1
+
+
+"@babel/code-frame@^7.0.0", "@babel/code-frame@^7.10.4":
+  version "7.12.13"
+  dependencies:
+    "@babel/highlight" "^7.12.13"
+
+accepts@~1.3.8:
+  version "1.3.8"
+
+express@^4.17.1, express@^4.18.2:
+  version "4.18.2"
+  dependencies:
+    accepts "~1.3.8"
+"""
+
+
+class LockfileDepsTest(unittest.TestCase):
+    def test_pnpm_v5_direct_dependencies(self):
+        self.assertEqual(_lockfile_deps("pnpm-lock.yaml", PNPM_V5), ["@types/node", "express"])
+
+    def test_pnpm_v6_direct_dependencies(self):
+        self.assertEqual(_lockfile_deps("pnpm-lock.yaml", PNPM_V6), ["@nestjs/core", "express"])
+
+    def test_yarn_v1_resolved_packages(self):
+        self.assertEqual(_lockfile_deps("yarn.lock", YARN_V1), ["@babel/code-frame", "accepts", "express"])
+
+    def test_pnpm_without_dependencies(self):
+        self.assertEqual(_lockfile_deps("pnpm-lock.yaml", "lockfileVersion: '6.0'\n"), [])
+
+
+class SummarizeLockfileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _summary(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return summarize_lockfile(path, os.path.getsize(path))
+
+    def test_summary_lists_dependencies(self):
+        size = len(PNPM_V6.encode())
+        self.assertEqual(
+            self._summary("pnpm-lock.yaml", PNPM_V6),
+            f"<lockfile, {size} bytes, deps: @nestjs/core, express>",
+        )
+
+    def test_unparsable_lockfile_keeps_size_only(self):
+        self.assertEqual(self._summary("package-lock.json", "{not json"), "<lockfile, 9 bytes>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.worker import _best_port, _port_file_rank, scan_repo
+
+LOG = logging.getLogger("test_scan")
+
+DOCKERFILE = "FROM python:3.12\nEXPOSE 5000\nCMD python app.py\n"
+COMPOSE = "services:\n  web:\n    build: .\n    ports:\n      - '8000:8000'\n"
+APP_PY = "from flask import Flask\napp = Flask(__name__)\napp.run(port=9000)\n"
+
+
+class PortRankTest(unittest.TestCase):
+    def test_file_rank_orders_dockerfile_compose_code(self):
+        self.assertLess(_port_file_rank("Dockerfile"), _port_file_rank("docker-compose.yml"))
+        self.assertEqual(_port_file_rank("compose.yaml"), _port_file_rank("docker-compose.yml"))
+        self.assertLess(_port_file_rank("docker-compose.yml"), _port_file_rank("app.py"))
+
+    def test_best_port_prefers_expose_within_a_file(self):
+        self.assertEqual(_best_port(b"port = 9000\nEXPOSE 5000\n"), (0, 5000))
+        self.assertEqual(_best_port(b"app.listen(3000)\n"), (3, 3000))
+        self.assertIsNone(_best_port(b"EXPOSE 70000\n"))
+
+
+class ScanRepoPortTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.repo, ignore_errors=True)
+
+    def _write(self, rel, content):
+        path = os.path.join(self.repo, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_dockerfile_beats_compose_and_code(self):
+        # Declarations sit in nested dirs so read order does not decide the winner
+        self._write("app.py", APP_PY)
+        self._write("deploy/docker-compose.yml", COMPOSE)
+        self._write("docker/Dockerfile", DOCKERFILE)
+        self.assertEqual(scan_repo(self.repo, LOG).port, 5000)
+
+    def test_compose_beats_code(self):
+        self._write("app.py", APP_PY)
+        self._write("deploy/docker-compose.yml", COMPOSE)
+        self.assertEqual(scan_repo(self.repo, LOG).port, 8000)
+
+    def test_code_port_without_docker_files(self):
+        self._write("app.py", APP_PY)
+        scan = scan_repo(self.repo, LOG)
+        self.assertEqual(scan.port, 9000)
+        self.assertFalse(scan.has_docker)
+
+    def test_early_exit_still_detects_localhost_binding(self):
+        # Root files settle the port (EXPOSE) and HTTP detection before the nested source is read
+        self._write("Dockerfile", DOCKERFILE)
+        self._write("app.py", APP_PY)
+        self._write("src/server.py", "app.run(host='127.0.0.1')\n")
+        scan = scan_repo(self.repo, LOG)
+        self.assertTrue(scan.http_ok)
+        self.assertEqual(scan.port, 5000)
+        self.assertTrue(scan.binds_localhost)
+
+
+if __name__ == "__main__":
+    unittest.main()
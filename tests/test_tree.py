@@ -0,0 +1,62 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from app.worker import list_parent_tree, list_tree, scan_repo
+
+
+class ListParentTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.parent = os.path.join(self.tmp, "job")
+        self.repo = os.path.join(self.parent, "repo")
+        for rel in (
+            "Dockerfile",
+            "job.log",
+            "repo/README.md",
+            "repo/src/app.py",
+            "repo/a/b/c/d/e/deep.txt",
+            "terraform/main.tf",
+        ):
+            self._touch(rel)
+        # Over the (patched) per-directory cap: listed as a summary, not expanded
+        for i in range(5):
+            self._touch(f"repo/assets/img{i}.png")
+            self._touch(f"cache/blob{i}")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _touch(self, rel):
+        path = os.path.join(self.parent, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write("x\n")
+
+    def _assert_same_as_list_tree(self, max_items):
+        expected = list_tree(os.path.dirname(self.repo), max_items=max_items)
+        repo_tree = list_tree(self.repo, max_items=max_items)
+        self.assertEqual(list_parent_tree(self.repo, repo_tree, max_items=max_items), expected)
+        scan = scan_repo(self.repo, logging.getLogger("test_tree"), max_items=max_items)
+        self.assertEqual(list_parent_tree(self.repo, scan.tree, max_items=max_items), expected)
+        return expected
+
+    @mock.patch("app.worker.LIST_TREE_DIR_MAX_ENTRIES", 4)
+    def test_matches_list_tree_with_dir_summaries(self):
+        expected = self._assert_same_as_list_tree(max_items=500)
+        self.assertIn("cache/ (5 entries, not listed)", expected)
+        self.assertIn("repo/assets/ (5 entries, not listed)", expected)
+        self.assertIn("repo/a/b/c/", expected)
+
+    @mock.patch("app.worker.LIST_TREE_DIR_MAX_ENTRIES", 4)
+    def test_matches_list_tree_under_max_items(self):
+        for max_items in (1, 4, 7, 10):
+            with self.subTest(max_items=max_items):
+                self.assertEqual(len(self._assert_same_as_list_tree(max_items)), max_items)
+
+
+if __name__ == "__main__":
+    unittest.main()